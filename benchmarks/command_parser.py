@@ -0,0 +1,50 @@
+"""
+Compares per-invocation cost of CommandParser with the former argparse + shlex path
+
+    python benchmarks/command_parser.py
+"""
+import inspect
+import shlex
+import timeit
+from argparse import ArgumentParser
+
+from vkpybot.bot import CommandParser, tokenize
+from vkpybot.utils import StoreDict
+
+
+def command(message, week_day: str, lecture_n: int, ratio: float = .5, fields: dict = None):
+    pass
+
+
+def argparse_parser(signature: inspect.Signature) -> ArgumentParser:
+    parser = ArgumentParser(exit_on_error=False)
+    for name, param in signature.parameters.items():
+        if name == 'message':
+            continue
+        annotation = str if param.annotation is param.empty else param.annotation
+        kwargs = {'type': annotation, 'nargs': '?'}
+        if param.default is not param.empty:
+            kwargs |= {'default': str(param.default)}
+        if isinstance(annotation(), dict):
+            kwargs['action'] = StoreDict
+            kwargs['nargs'] = '+'
+            del kwargs['type']
+        parser.add_argument(name, **kwargs)
+    return parser
+
+
+def main(number: int = 20000):
+    signature = inspect.signature(command)
+    old = argparse_parser(signature)
+    new = CommandParser(signature)
+    for text in ('/update monday 3 0.7 time=10:00 room=101',
+                 '/update "next monday" 3 0.7 "teacher=John Smith"'):
+        old_time = timeit.timeit(lambda: vars(old.parse_args(shlex.split(text)[1:])), number=number)
+        new_time = timeit.timeit(lambda: new.parse(tokenize(text)[1:]), number=number)
+        print(text)
+        print(f'  argparse + shlex: {old_time / number * 1e6:8.2f} us')
+        print(f'  CommandParser:    {new_time / number * 1e6:8.2f} us ({old_time / new_time:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
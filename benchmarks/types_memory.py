@@ -0,0 +1,78 @@
+"""
+Measures memory, that is taken by cached users and chats, compared with the former dict-backed objects
+
+    python benchmarks/types_memory.py [number of users]
+"""
+import sys
+import tracemalloc
+
+from vkpybot.cache import LRUCache
+from vkpybot.types import Conversation, PrivateChat, User
+
+
+class DictUser:
+    def __init__(self, usr: dict, *, session):
+        self._session = session
+        self.id: int = int(usr['id'])
+        self.first_name: str = usr['first_name']
+        self.last_name: str = usr['last_name']
+        self.is_closed: bool = bool(usr['is_closed'])
+        self.can_access_closed: bool = bool(usr['can_access_closed'])
+
+
+class DictConversation:
+    def __init__(self, chat_dict, *, session):
+        self._session = session
+        self.id = chat_dict['peer']['id']
+        self.title = chat_dict['chat_settings']['title']
+        self.owner = chat_dict['admins'][0]
+        self.admins = chat_dict['admins'][1:]
+        self.member_count = chat_dict['chat_settings']['members_count']
+
+
+def user_dict(i: int) -> dict:
+    return {'id': i, 'first_name': 'Ivan', 'last_name': 'Ivanov', 'is_closed': False, 'can_access_closed': True}
+
+
+def private_chat_dict(i: int) -> dict:
+    return {'peer': {'type': 'user', 'id': i}}
+
+
+def conversation_dict(i: int) -> dict:
+    return {'peer': {'type': 'chat', 'id': 2000000000 + i},
+            'chat_settings': {'title': 'Group', 'members_count': 30},
+            'admins': [1, 2]}
+
+
+def measure(cls, make_dict, number: int) -> float:
+    """
+    Returns:
+        bytes per object kept in LRUCache
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = LRUCache(maxsize=None)
+    for i in range(number):
+        obj = cls(make_dict(i), session=None)
+        cache[obj.id] = obj
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del cache
+    return size / number
+
+
+def main(number: int = 1_000_000):
+    print(f'{number} cached objects, bytes per object (including cache entry):')
+    for name, old, new, make_dict in (('User', DictUser, User, user_dict),
+                                      ('PrivateChat', None, PrivateChat, private_chat_dict),
+                                      ('Conversation', DictConversation, Conversation, conversation_dict)):
+        new_size = measure(new, make_dict, number)
+        if old is None:
+            print(f'  {name:<13} dict-backed: {"-":>7}  slotted: {new_size:7.1f}')
+            continue
+        old_size = measure(old, make_dict, number)
+        print(f'  {name:<13} dict-backed: {old_size:7.1f}  slotted: {new_size:7.1f} ({1 - new_size / old_size:.0%} less)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
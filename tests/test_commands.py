@@ -0,0 +1,123 @@
+import asyncio
+import threading
+
+import pytest
+
+from vkpybot.bot import Command, ExecutionMode, Regex, RegexHandler, tokenize
+from vkpybot.routing import CommandRouter
+from vkpybot.types import Message, PrivateChat, User
+
+
+def make_message(text: str) -> Message:
+    sender = User({'id': 1, 'first_name': 'Vlaterran', 'last_name': 'Vlatterran',
+                   'is_closed': False, 'can_access_closed': True}, session=None)
+    chat = PrivateChat({'peer': {'id': 1}}, session=None)
+    return Message({'date': 0, 'text': text, 'sender': sender, 'chat': chat, 'conversation_message_id': 1},
+                   session=None)
+
+
+def square(n: int):
+    return str(n * n)
+
+
+square_command = Command(square, execution=ExecutionMode.PROCESS)
+
+
+@pytest.mark.asyncio
+async def test_sync_command_runs_in_thread():
+    command = Command(lambda: threading.get_ident(), name='ident')
+    assert await command(make_message('/ident')) != threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_command_in_process_pool():
+    assert await square_command(make_message('/square 12')) == '144'
+
+
+@pytest.mark.asyncio
+async def test_command_timeout():
+    async def slow():
+        await asyncio.sleep(1)
+
+    command = Command(slow, timeout=0.01)
+    assert await command(make_message('/slow')) == 'Command slow timed out'
+
+
+@pytest.mark.asyncio
+async def test_timed_out_thread_keeps_concurrency_slot():
+    release = threading.Event()
+    started = []
+
+    def hang():
+        started.append(1)
+        release.wait()
+
+    command = Command(hang, max_concurrency=1, timeout=0.05)
+    assert await command(make_message('/hang')) == 'Command hang timed out'
+    # the first execution is still running, so the second one can't start
+    assert await command(make_message('/hang')) == 'Command hang timed out'
+    assert len(started) == 1
+    release.set()
+    assert await command(make_message('/hang')) is None
+    assert len(started) == 2
+
+
+def test_command_parser():
+    def command(message, a, b: int = 1, c: float = .5, fields: dict = None):
+        pass
+
+    parser = Command(command).parser
+    assert parser.parse(['x', '2']) == {'a': 'x', 'b': 2, 'c': .5, 'fields': None}
+    assert parser.parse(['x', '2', '3', 'k=v', 'n=1']) == {'a': 'x', 'b': 2, 'c': 3., 'fields': {'k': 'v', 'n': '1'}}
+    assert parser.parse([]) == {'a': None, 'b': 1, 'c': .5, 'fields': None}
+    with pytest.raises(ValueError):
+        parser.parse(['x', 'two'])
+    with pytest.raises(ValueError):
+        parser.parse(['x', '2', '3', 'novalue'])
+
+
+def test_tokenize():
+    assert tokenize('/cmd a  b') == ['/cmd', 'a', 'b']
+    assert tokenize('/cmd "a b" c') == ['/cmd', 'a b', 'c']
+
+
+@pytest.mark.asyncio
+async def test_invalid_arguments():
+    assert await square_command(make_message('/square x')) == 'Invalid arguments for command square'
+
+
+@pytest.mark.asyncio
+async def test_regex_handler_calls_only_matched():
+    called = []
+
+    def regex(pattern):
+        async def func(message):
+            called.append(pattern)
+
+        return Regex(func, pattern)
+
+    handler = RegexHandler()
+    for pattern in ('.*hi.*', r'(?P<word>\w+) (?P=word)', 'bye', '(?P<n>\\d+)', '(?P<n>[a-z]+)!'):
+        handler.add_regex(regex(pattern))
+    assert len(handler._separate_regexes) == 2
+    await handler.handle_regex(make_message('hi hi'))
+    assert called == ['.*hi.*', r'(?P<word>\w+) (?P=word)']
+    called.clear()
+    await handler.handle_regex(make_message('no match'))
+    assert called == []
+
+
+def test_command_router():
+    router = CommandRouter()
+    for name in ('help', 'hello', 'admin ban', 'admin kick', 'Schedule'):
+        router.add(name, name)
+    assert router.resolve(['HELP', 'x']) == ('help', 1)
+    assert router.resolve(['sch']) == ('Schedule', 1)
+    assert router.resolve(['hel']) is None
+    assert router.resolve(['admin', 'kick', 'user']) == ('admin kick', 2)
+    assert router.resolve(['admin', 'b', 'user']) == ('admin ban', 2)
+    assert router.suggest('helo') in ('help', 'hello')
+    assert router.suggest('shedule') == 'schedule'
+    assert router.suggest('xyz') is None
+    with pytest.raises(ValueError):
+        router.add('Help', 'other')
@@ -0,0 +1,249 @@
+import asyncio
+import re
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses
+
+import vkpybot
+from vkpybot.checkpoint import FileCheckpointStore, SQLiteCheckpointStore
+from vkpybot.dispatch import EventDispatcher, OverflowPolicy
+from vkpybot.servers import CircuitState, LongPollServer
+from vkpybot.utils import Backoff
+
+
+def api_method(method):
+    return re.compile(rf'https://api.vk.com/method/{method}.*')
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_limits_concurrency():
+    running = []
+    peak = 0
+
+    async def handler(event):
+        nonlocal peak
+        running.append(event)
+        peak = max(peak, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(event)
+
+    dispatcher = EventDispatcher(handler, max_concurrency=2)
+    for i in range(6):
+        await dispatcher.put({'type': 'message_new', 'n': i})
+    await dispatcher.close()
+    assert peak == 2
+    assert dispatcher.handled == 6
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_drops_by_type_when_full():
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(event):
+        await release.wait()
+        handled.append(event['type'])
+
+    dispatcher = EventDispatcher(handler, max_concurrency=1, max_queue=2, overflow=OverflowPolicy.DROP_BY_TYPE)
+    await dispatcher.put({'type': 'message_new'})
+    await asyncio.sleep(0)
+    await dispatcher.put({'type': 'message_typing_state'})
+    await dispatcher.put({'type': 'message_new'})
+    await dispatcher.put({'type': 'message_new'})
+    release.set()
+    await dispatcher.close()
+    assert dispatcher.dropped == {'message_typing_state': 1}
+    assert handled == ['message_new'] * 3
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_orders_events_of_the_same_chat():
+    log = []
+
+    async def handler(event):
+        message = event['object']['message']
+        log.append(('start', message['peer_id'], message['n']))
+        await asyncio.sleep(0.01 if message['n'] == 0 else 0)
+        log.append(('end', message['peer_id'], message['n']))
+
+    dispatcher = EventDispatcher(handler, max_concurrency=4)
+    for peer_id, n in [(1, 0), (1, 1), (2, 2)]:
+        await dispatcher.put({'type': 'message_new', 'object': {'message': {'peer_id': peer_id, 'n': n}}})
+    await dispatcher.close()
+    assert log.index(('end', 1, 0)) < log.index(('start', 1, 1))
+    assert log.index(('end', 2, 2)) < log.index(('end', 1, 0))
+
+
+@pytest.mark.asyncio
+async def test_long_poll_requests_next_events_while_dispatching():
+    server = LongPollServer(vkpybot.sessions.Session('token'), 'https://lp.vk.com/wh1', 'key', 1)
+    batches = [[{'type': 'message_new'}], []]
+    log = []
+
+    async def a_check():
+        log.append('poll')
+        if not batches:
+            raise RuntimeError('stop')
+        return batches.pop(0)
+
+    async def notify_listeners(event):
+        log.append('dispatch')
+
+    server.a_check = a_check
+    server.notify_listeners = notify_listeners
+    await server._listen()
+    assert log == ['poll', 'poll', 'dispatch', 'poll']
+
+
+@pytest.mark.asyncio
+async def test_long_poll_backs_off_and_recovers():
+    server = LongPollServer(vkpybot.sessions.Session('token'), 'https://lp.vk.com/wh1', 'key', 1,
+                            backoff=Backoff(base=0.001, jitter=False))
+    states = []
+    on_failure = server._on_failure
+
+    async def record_failure(error):
+        await on_failure(error)
+        states.append((server.circuit_state, type(server.last_error)))
+
+    server._on_failure = record_failure
+    with aioresponses() as m:
+        m.get(re.compile(r'https://lp\.vk\.com/wh1.*'), exception=aiohttp.ClientConnectionError())
+        m.get(re.compile(r'https://lp\.vk\.com/wh1.*'), status=502)
+        m.get(re.compile(r'https://lp\.vk\.com/wh1.*'), payload={'ts': 2, 'updates': [{'type': 'message_new'}]})
+        async with server.vk_session:
+            assert await server.a_check() == [{'type': 'message_new'}]
+    assert states == [(CircuitState.OPEN, aiohttp.ClientConnectionError),
+                      (CircuitState.OPEN, aiohttp.ClientResponseError)]
+    assert (server.circuit_state, server.failures, server.ts) == (CircuitState.CLOSED, 0, 2)
+
+
+@pytest.mark.parametrize('store', [FileCheckpointStore, SQLiteCheckpointStore])
+def test_checkpoint_store_persists_ts(store, tmp_path):
+    checkpoint = store(tmp_path / 'checkpoint', flush_interval=60)
+    assert checkpoint.load() is None
+    checkpoint.save(10)
+    checkpoint.save(11)
+    checkpoint.close()
+    assert store(tmp_path / 'checkpoint').load() == '11'
+
+
+@pytest.mark.asyncio
+async def test_long_poll_resumes_from_checkpoint(tmp_path):
+    checkpoint = FileCheckpointStore(tmp_path / 'checkpoint', flush_interval=0)
+    checkpoint.save(5)
+    server = LongPollServer(vkpybot.sessions.Session('token'), 'https://lp.vk.com/wh1', 'key', 100,
+                            checkpoint=checkpoint)
+    assert server.ts == '5'
+    batches = [[{'type': 'like_add', 'object': {}}]]
+
+    async def a_check():
+        if not batches:
+            raise RuntimeError('stop')
+        server.ts = '6'
+        return batches.pop(0)
+
+    server.a_check = a_check
+    await server._listen()
+    assert checkpoint.load() == '6'
+
+
+@pytest.mark.asyncio
+async def test_events_are_parsed_with_lookups_only_for_named_fields():
+    session = vkpybot.sessions.Session('token')
+    server = LongPollServer(session, 'https://lp.vk.com/wh1', 'key', 1)
+    calls = []
+
+    class Listener(vkpybot.events.EventHandler):
+        async def on_like_add(self, liker, object_id, **context):
+            calls.append(('like', liker.id, object_id, context['object_type']))
+
+        async def on_wall_reply_new(self, comment, post_id):
+            calls.append(('reply', comment['text'], post_id))
+
+        async def on_board_post_restore(self, **context):
+            calls.append(('restore', context))
+
+    server.bind_listener(Listener())
+    with aioresponses() as m:
+        m.get(api_method('users.get'), payload={'response': [{'id': 5, 'first_name': 'Ivan', 'last_name': 'Ivanov',
+                                                              'is_closed': False, 'can_access_closed': True}]})
+        async with session:
+            await server._notify_listeners({'type': 'like_add', 'object': {
+                'liker_id': 5, 'object_type': 'post', 'object_owner_id': -1, 'object_id': 10}})
+            await server._notify_listeners({'type': 'wall_reply_new', 'object': {
+                'id': 1, 'from_id': 5, 'text': 'hi', 'post_id': 10, 'post_owner_id': -1}})
+            await server._notify_listeners({'type': 'board_post_restore', 'object': {'id': 1, 'topic_id': 2}})
+            await server._notify_listeners({'type': 'group_join', 'object': {'user_id': 5}})
+        assert sum(map(len, m.requests.values())) == 1
+    assert calls == [('like', 5, 10, 'post'), ('reply', 'hi', 10),
+                     ('restore', {'comment': {'id': 1, 'topic_id': 2}, 'topic_id': 2})]
+
+
+@pytest.mark.asyncio
+async def test_events_without_handlers_are_skipped_before_parsing():
+    server = LongPollServer(vkpybot.sessions.Session('token'), 'https://lp.vk.com/wh1', 'key', 1)
+    handled = []
+
+    class Listener(vkpybot.events.EventHandler):
+        async def on_message_deny(self, user_id):
+            handled.append(user_id)
+
+    server.bind_listener(Listener())
+    assert set(server.subscriptions) == {vkpybot.events.EventType.MESSAGE_DENY}
+    typing = await server.notify_listeners({'type': 'message_typing_state', 'object': {'from_id': 1}})
+    unknown = await server.notify_listeners({'type': 'group_join', 'object': {'user_id': 1}})
+    deny = await server.notify_listeners({'type': 'message_deny', 'object': {'user_id': 1}})
+    assert await asyncio.gather(typing, unknown, deny) == [False, False, True]
+    await server.dispatcher.close()
+    assert handled == [1]
+    assert server.skipped == {'message_typing_state': 1, 'group_join': 1}
+    assert server.dispatched == {'message_deny': 1}
+
+
+@pytest.mark.asyncio
+async def test_listener_with_own_call_gets_whole_context_and_drops_are_not_dispatched():
+    session = vkpybot.sessions.Session('token')
+
+    async def get_user(user_id):
+        return f'user{user_id}'
+
+    session.get_user = get_user
+    server = LongPollServer(session, 'https://lp.vk.com/wh1', 'key', 1,
+                            max_concurrency=1, max_queue=1, overflow=OverflowPolicy.DROP_OLDEST)
+    release = asyncio.Event()
+    received = []
+
+    class Listener(vkpybot.events.EventHandler):
+        async def __call__(self, event, **context):
+            received.append((event, context))
+            await release.wait()
+
+    server.bind_listener(Listener())
+    done = []
+    for i in range(3):
+        done.append(await server.notify_listeners({'type': 'message_deny', 'object': {'user_id': i}}))
+        await asyncio.sleep(0)
+    release.set()
+    await server.dispatcher.close()
+    assert [future.result() for future in done] == [True, False, True]
+    assert received[0] == (vkpybot.events.EventType.MESSAGE_DENY, {'user_id': 0, 'user': 'user0'})
+    assert server.dispatched == {'message_deny': 2}
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_survives_cancelled_handlers():
+    handled = []
+
+    async def handler(event):
+        cancelled = asyncio.get_running_loop().create_future()
+        cancelled.cancel()
+        handled.append(event['n'])
+        await cancelled
+
+    dispatcher = EventDispatcher(handler, max_concurrency=2, ordering=None)
+    done = [await dispatcher.put({'type': 'message_new', 'n': i}) for i in range(3)]
+    await asyncio.wait_for(dispatcher.close(), 1)
+    assert sorted(handled) == [0, 1, 2]
+    assert [future.result() for future in done] == [True] * 3
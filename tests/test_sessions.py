@@ -0,0 +1,356 @@
+import asyncio
+import re
+import time
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses
+
+import vkpybot
+from vkpybot.outbox import Outbox
+
+
+def api_method(method):
+    return re.compile(rf'https://api.vk.com/method/{method}.*')
+
+
+@pytest.mark.asyncio
+async def test_http_pool_is_reused():
+    session = vkpybot.sessions.Session('token')
+    with aioresponses() as m:
+        m.get(api_method('users.get'), payload={'response': []}, repeat=True)
+        async with session:
+            http = session.http
+            await session.method('users.get')
+            await session.method('users.get')
+            assert session.http is http
+        assert http.closed
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_paces_requests():
+    limiter = vkpybot.scheduler.RateLimiter(rate=50, burst=1)
+    start = asyncio.get_running_loop().time()
+    tasks = [asyncio.create_task(limiter.acquire()) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 4
+    await asyncio.gather(*tasks)
+    assert asyncio.get_running_loop().time() - start >= 4 / 50 * 0.9
+    assert limiter.wait_stats.count == 5
+    assert limiter.wait_stats.max > 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_bounded_queue():
+    limiter = vkpybot.scheduler.RateLimiter(rate=1, burst=1, max_queue=1)
+    await limiter.acquire()
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(asyncio.QueueFull):
+        await limiter.acquire()
+    waiting.cancel()
+
+
+@pytest.mark.asyncio
+async def test_calls_are_batched_into_execute():
+    session = vkpybot.sessions.Session('token', batch_window=0.01)
+    with aioresponses() as m:
+        m.post(api_method('execute'), payload={
+            'response': [[{'id': 1}], False, 1],
+            'execute_errors': [{'method': 'messages.send', 'error_code': 7, 'error_msg': 'Permission denied'}]
+        })
+        async with session:
+            results = await asyncio.gather(session.method('users.get', {'user_ids': [1]}),
+                                           session.method('messages.send', {'peer_id': 1}),
+                                           session.method('messages.send', {'peer_id': 2}),
+                                           return_exceptions=True)
+        request, = m.requests.values()
+    assert len(request) == 1
+    assert 'API.users.get({"user_ids": "1"})' in request[0].kwargs['data']['code']
+    assert results[0] == [{'id': 1}]
+    assert isinstance(results[1], vkpybot.errors.VKAPIError) and results[1].code == 7
+    assert results[2] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_loader_coalesces_keys():
+    batches = []
+
+    async def load(keys):
+        batches.append(keys)
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = vkpybot.scheduler.BatchLoader(load, max_batch_size=2)
+    results = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(3),
+                                   return_exceptions=True)
+    assert batches == [[1, 2], [3]]
+    assert results[:3] == [10, 20, 10]
+    assert isinstance(results[3], KeyError)
+
+
+def test_lru_cache_eviction_and_ttl(monkeypatch):
+    now = [0.]
+    monkeypatch.setattr(vkpybot.cache.time, 'monotonic', lambda: now[0])
+    cache = vkpybot.cache.LRUCache(maxsize=2, ttl=10)
+    cache[1], cache[2] = 'a', 'b'
+    assert cache.get(1) == 'a'
+    cache[3] = 'c'
+    assert 2 not in cache and 1 in cache
+    now[0] = 11
+    assert cache.get(1) is None
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions, cache.stats.expirations) == (1, 1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_chat_lookups_share_request():
+    session = vkpybot.sessions.Session('token')
+    with aioresponses() as m:
+        m.get(api_method('messages.getConversationsById'), payload={'response': {'items': [
+            {'peer': {'type': 'user', 'id': 1}},
+            {'peer': {'type': 'user', 'id': 2}},
+        ]}})
+        async with session:
+            chats = await asyncio.gather(session.get_chat(1), session.get_chat(2), session.get_chat(1))
+        request, = m.requests.values()
+    assert len(request) == 1
+    assert [chat.id for chat in chats] == [1, 2, 1]
+    assert chats[0] is chats[2]
+
+
+@pytest.mark.asyncio
+async def test_outbox_merges_and_groups_messages():
+    requests = []
+
+    class FakeSession:
+        async def method(self, method, params, priority=None):
+            requests.append(params)
+            if 'peer_id' in params:
+                return len(requests)
+            return [{'peer_id': int(peer_id), 'message_id': len(requests)} for peer_id in params['peer_ids'].split(',')]
+
+    outbox = Outbox(FakeSession(), window=0.01)
+    reply = {'forward': '{"conversation_message_ids": [1]}'}
+    results = await asyncio.gather(outbox.send(1, {'message': 'hi'}),
+                                   outbox.send(2, {'message': 'hi'}),
+                                   outbox.send(3, {'message': 'x'} | reply),
+                                   outbox.send(3, {'message': 'y'} | reply),
+                                   outbox.send(4, {'message': 'a' * 5000, 'attachment': 'photo1_1'}))
+    texts = sorted((str(params.get('peer_ids', params.get('peer_id'))), params['message'][:5], 'attachment' in params)
+                   for params in requests)
+    assert texts == [('1,2', 'hi', False), ('3', 'x\ny', False), ('4', 'a' * 5, False), ('4', 'a' * 5, True)]
+    assert results[0]['peer_id'] == 1 and results[1]['peer_id'] == 2
+    assert results[2] == results[3] and results[2]['peer_id'] == 3
+    assert results[4]['message_id'] == len(requests)
+    assert not vkpybot.sessions.Session('token', outbox_window=0.01).outbox.group_peers
+
+
+@pytest.mark.asyncio
+async def test_outbox_keeps_priority_of_split_messages():
+    priorities = []
+
+    class FakeSession:
+        async def method(self, method, params, priority=None):
+            priorities.append(priority)
+            return 1
+
+    outbox = Outbox(FakeSession(), window=0.01)
+    await outbox.send(1, {'message': 'a' * 5000}, vkpybot.scheduler.Priority.INTERACTIVE)
+    assert priorities == [vkpybot.scheduler.Priority.INTERACTIVE] * 2
+
+
+@pytest.mark.asyncio
+async def test_broadcast_retries_transient_errors_and_resumes():
+    requests = []
+
+    class FakeSession:
+        async def method(self, method, params, priority=None, retries=None):
+            requests.append(params)
+            if len(requests) == 1:
+                raise vkpybot.errors.VKAPIError(6, 'Too many requests per second')
+            if params['peer_ids'].startswith('3'):
+                raise vkpybot.errors.VKAPIError(7, 'Permission denied')
+            return [{'peer_id': int(peer_id), 'message_id': 1} for peer_id in params['peer_ids'].split(',')]
+
+    state = vkpybot.broadcast.BroadcastState(done=[5])
+    backoff = vkpybot.utils.Backoff(base=0, jitter=False)
+    results = [result async for result in vkpybot.broadcast.broadcast(
+        FakeSession(), [1, 2, 3, 4, 5, 1], {'message': 'hi'}, chunk_size=2, backoff=backoff, state=state)]
+    assert requests[0]['random_id'] == requests[1]['random_id']
+    assert sorted(result['peer_id'] for result in results) == [1, 2, 3, 4]
+    assert (state.sent, state.failed, state.done) == (2, 2, {1, 2, 3, 4, 5})
+    assert vkpybot.broadcast.BroadcastState.from_dict(state.to_dict()).done == state.done
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_serves_priorities_with_bulk_share():
+    Priority = vkpybot.scheduler.Priority
+    limiter = vkpybot.scheduler.RateLimiter(rate=1000, burst=1, bulk_share=0.5)
+    await limiter.acquire()
+    order = []
+
+    async def request(name, priority):
+        await limiter.acquire(priority)
+        order.append(name)
+
+    tasks = [asyncio.create_task(request(f'bulk{i}', Priority.BULK)) for i in range(2)]
+    tasks += [asyncio.create_task(request(f'normal{i}', Priority.NORMAL)) for i in range(2)]
+    tasks += [asyncio.create_task(request('interactive', Priority.INTERACTIVE))]
+    await asyncio.gather(*tasks)
+    assert order == ['interactive', 'bulk0', 'normal0', 'bulk1', 'normal1']
+    assert limiter.lane_stats[Priority.BULK].count == 2
+    assert limiter.wait_stats.count == 6
+
+
+@pytest.mark.asyncio
+async def test_send_message_is_retried_with_same_random_id():
+    session = vkpybot.sessions.Session('token', retry_backoff=vkpybot.utils.Backoff(base=0))
+    chat = vkpybot.types.PrivateChat({'peer': {'type': 'user', 'id': 1}}, session=session)
+    with aioresponses() as m:
+        m.get(api_method('messages.send'), exception=aiohttp.ClientConnectionError())
+        m.get(api_method('messages.send'), payload={'error': {'error_code': 6, 'error_msg': 'Too many requests'}})
+        m.get(api_method('messages.send'), payload={'response': 1})
+        async with session:
+            assert await session.send_message(chat, 'hi') == 1
+        request, = m.requests.values()
+    assert len({call.kwargs['params']['random_id'] for call in request}) == 1
+    assert session.retried['messages.send'] == 2
+    assert not session.retries_exhausted
+
+
+@pytest.mark.asyncio
+async def test_errors_are_typed_and_handled_by_code():
+    captchas = []
+    session = vkpybot.sessions.Session('token', captcha_handler=lambda e: captchas.append(e) or 'key')
+    with aioresponses() as m:
+        m.get(api_method('wall.post'), payload={'error': {'error_code': 14, 'error_msg': 'Captcha needed',
+                                                          'captcha_sid': '42', 'captcha_img': 'img'}})
+        m.get(api_method('wall.post'), payload={'response': 1})
+        m.get(api_method('users.get'), payload={'error': {'error_code': 5, 'error_msg': 'User authorization failed'}})
+        async with session:
+            assert await session.method('wall.post', {'message': 'hi'}) == 1
+            with pytest.raises(vkpybot.errors.AuthorizationError) as error:
+                await session.method('users.get', {'user_ids': 1})
+            # the session doesn't make requests with invalid token
+            with pytest.raises(vkpybot.errors.AuthorizationError):
+                await session.method('users.get', {'user_ids': 1})
+        calls = [call for calls in m.requests.values() for call in calls]
+    assert calls[1].kwargs['params']['captcha_key'] == 'key'
+    assert captchas[0].captcha_img == 'img' and captchas[0].params == {'message': 'hi'}
+    assert error.value.params == {'user_ids': 1} and len(calls) == 3
+    assert type(vkpybot.errors.VKAPIError.from_response({'error_code': 777, 'error_msg': ''})) is vkpybot.errors.VKAPIError
+
+
+@pytest.mark.asyncio
+async def test_uploads_are_cached_by_content(tmp_path):
+    image, copy = tmp_path / 'schedule.png', tmp_path / 'copy.png'
+    image.write_bytes(b'image')
+    copy.write_bytes(b'image')
+    with aioresponses() as m:
+        m.get(api_method('photos.getMessagesUploadServer'), payload={'response': {'upload_url': 'https://upload.vk.com/'}})
+        m.post('https://upload.vk.com/', body='{"photo": "1"}')
+        m.get(api_method('photos.saveMessagesPhoto'), payload={'response': [{'owner_id': 1, 'id': 2}]})
+        async with vkpybot.sessions.Session('token', image_cache=vkpybot.cache.SQLiteCache(tmp_path / 'uploads.db')) \
+                as session:
+            results = await asyncio.gather(session.upload_image(image), session.upload_image(copy))
+        # the cache survives restart
+        async with vkpybot.sessions.Session('token', image_cache=vkpybot.cache.SQLiteCache(tmp_path / 'uploads.db')) \
+                as session:
+            results.append(await session.upload_image(str(image)))
+        assert sum(map(len, m.requests.values())) == 3
+    assert results == ['photo1_2'] * 3
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    cache = vkpybot.cache.SQLiteCache(tmp_path / 'cache.db', maxsize=2)
+    cache['a'], cache['b'] = 1, [2]
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert 'b' not in cache and 'a' in cache and len(cache) == 2
+    assert cache.stats.evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_shares_server_and_batches_saving(tmp_path):
+    images = []
+    for name, content in ('a', b'a'), ('b', b'b'), ('c', b'a'):
+        images.append(str(tmp_path / name))
+        (tmp_path / name).write_bytes(content)
+    with aioresponses() as m:
+        m.get(api_method('photos.getMessagesUploadServer'), payload={'response': {'upload_url': 'https://upload.vk.com/'}})
+        m.post('https://upload.vk.com/', body='{"photo": "1"}', repeat=True)
+        m.post(api_method('execute'), payload={'response': [[{'owner_id': 1, 'id': 1}], [{'owner_id': 1, 'id': 2}]]})
+        async with vkpybot.sessions.Session('token') as session:
+            results = dict([result async for result in session.upload_images(images)])
+        calls = {url.path: len(requests) for (_, url), requests in m.requests.items()}
+    assert calls == {'/method/photos.getMessagesUploadServer': 1, '/': 2, '/method/execute': 1}
+    assert results[images[0]] == results[images[2]] != results[images[1]]
+
+
+def test_types_are_slotted_and_decoded_lazily():
+    user = vkpybot.types.User({'id': 1, 'first_name': 'Ivan', 'last_name': 'Ivanov',
+                               'is_closed': False, 'can_access_closed': True}, session=None)
+    assert not hasattr(user, '__dict__')
+    assert user.refer == '[id1|Ivan Ivanov]' and user.refer is user.refer
+    message = vkpybot.types.Message({'text': 'hi', 'sender': user, 'chat': None, 'conversation_message_id': 1,
+                                     'date': 0, 'attachments': [{'type': 'photo'}]}, session=None)
+    assert message._date is None
+    assert message.date.timestamp() == 0 and message.attachments == [{'type': 'photo'}]
+    assert message.reply_message is None and message.fwd_messages == []
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_is_not_retried():
+    session = vkpybot.sessions.Session('token', requests_per_second=1, max_wait=0.05)
+    await session.limiter.acquire()
+    start = asyncio.get_running_loop().time()
+    with pytest.raises(vkpybot.errors.QueueTimeoutError):
+        await session.method('users.get')
+    assert asyncio.get_running_loop().time() - start < 0.2
+    assert not session.retried
+
+
+@pytest.mark.asyncio
+async def test_upload_is_cached_before_it_is_finished():
+    session = vkpybot.sessions.Session('token')
+    uploads = []
+
+    async def upload():
+        uploads.append(1)
+        return 'photo1_1'
+
+    cache = vkpybot.cache.LRUCache()
+    first = asyncio.ensure_future(session._cached_upload(cache, 'key', upload))
+    await asyncio.sleep(0)
+    await session._uploads['key']
+    # the first caller hasn't resumed yet, but the next one already finds the upload in the cache
+    assert 'key' not in session._uploads and not first.done()
+    assert await session._cached_upload(cache, 'key', upload) == await first == 'photo1_1'
+    assert len(uploads) == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_never_exceeds_rate_within_a_second():
+    limiter = vkpybot.scheduler.RateLimiter(rate=5)
+    released = []
+
+    async def request():
+        await limiter.acquire()
+        released.append(time.monotonic())
+
+    await asyncio.gather(*(request() for _ in range(12)))
+    # n-th and (n + rate)-th requests are at least one second apart
+    assert all(later - earlier >= 0.99 for earlier, later in zip(released, released[5:]))
+
+
+@pytest.mark.asyncio
+async def test_user_session_broadcasts_one_chat_per_request():
+    session = vkpybot.sessions.Session('token', requests_per_second=None)
+    with aioresponses() as m:
+        m.get(api_method('messages.send'), payload={'response': 10}, repeat=True)
+        async with session:
+            results = [result async for result in session.broadcast([1, 2], 'hi')]
+        calls = [call.kwargs['params'] for calls in m.requests.values() for call in calls]
+    assert sorted(params['peer_id'] for params in calls) == [1, 2]
+    assert not any('peer_ids' in params for params in calls)
+    assert sorted(result['peer_id'] for result in results) == [1, 2]
+    assert all(result['message_id'] == 10 for result in results)
@@ -1,4 +1,12 @@
+from . import broadcast
+from . import cache
+from . import checkpoint
+from . import dispatch
+from . import errors
 from . import events
+from . import outbox
+from . import routing
+from . import scheduler
 from . import servers
 from . import sessions
 from .types import *
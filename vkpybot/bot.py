@@ -1,21 +1,23 @@
 import asyncio
 import enum
+import importlib
 import inspect
 import logging
 import logging.handlers
 import re
 import shlex
-from argparse import ArgumentParser
-from functools import update_wrapper
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial, update_wrapper
 from typing import Awaitable, Callable, Any
 
 import docstring_parser
 
+from vkpybot.checkpoint import CheckpointStore
 from vkpybot.events import EventHandler, EventType
+from vkpybot.routing import CommandRouter
 from vkpybot.servers import EventServer, LongPollServer, YandexCloudFunction
 from vkpybot.sessions import GroupSession
 from vkpybot.types import PrivateChat, Message
-from vkpybot.utils import StoreDict
 
 
 class AccessLevel(enum.IntEnum):
@@ -24,6 +26,47 @@ class AccessLevel(enum.IntEnum):
     BOT_ADMIN = enum.auto()
 
 
+class ExecutionMode(enum.Enum):
+    """
+    Defines where synchronous command-functions are executed
+    """
+    # in the event loop (blocks handling of other events)
+    INLINE = enum.auto()
+    # in the thread pool of commands (separate from the default executor, so hanging commands don't block
+    # file operations of the session)
+    THREAD = enum.auto()
+    # in the process pool (for CPU-bound commands, arguments and results must be picklable)
+    PROCESS = enum.auto()
+
+
+_thread_pool: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(thread_name_prefix='vkpybot-command')
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor()
+    return _process_pool
+
+
+def _call_in_process(module: str, qualname: str, kwargs: dict):
+    # the function is resolved by its name, because decorated functions are replaced by Command-objects
+    func = importlib.import_module(module)
+    for name in qualname.split('.'):
+        func = getattr(func, name)
+    if isinstance(func, Command):
+        func = func._func
+    return func(**kwargs)
+
+
 class Bot(EventHandler):
     """
     Class, that implements the GroupBot.
@@ -40,7 +83,8 @@ class Bot(EventHandler):
                  loglevel=logging.INFO,
                  stdout_log=True,
                  command_prefix='/',
-                 server_type='longpoll'):
+                 server_type='longpoll',
+                 checkpoint: 'CheckpointStore' = None):
         """
         Args:
             access_token: API_TOKEN for group
@@ -49,6 +93,7 @@ class Bot(EventHandler):
             event_server:
             log_file:
             loglevel:
+            checkpoint: store of the last handled long poll event, that allows to resume after restart
         """
         super().__init__()
         self._on_startup_async = []
@@ -60,11 +105,14 @@ class Bot(EventHandler):
         if event_server is None:
             if server_type == 'longpoll':
                 self.server: EventServer = LongPollServer(self.session,
-                                                          **self.session.method_sync('groups.getLongPollServer'))
+                                                          **self.session.method_sync('groups.getLongPollServer'),
+                                                          checkpoint=checkpoint)
             elif server_type == 'ycf':
                 self.server: EventServer = YandexCloudFunction(self.session)
             else:
                 raise ValueError('Only longpoll or yvf server_type can be created automatically')
+        else:
+            self.server = event_server
 
         self.server.bind_listener(self)
 
@@ -96,12 +144,12 @@ class Bot(EventHandler):
         #                                                                          interval=1))
 
         # TODO: Add RegexHandler to the help
-        @self.command('help')
+        @self.command('help', execution=ExecutionMode.INLINE)
         def help_command(command: str = ''):
             if command == '':
                 a = '\n'
                 return f'Доступные команды: \n{a.join([x.short_help for x in self.commands])}'
-            elif command in self.commands.aliases:
+            elif command in self.commands:
                 return self.commands[command].help
             else:
                 return f"Command \"{command}\" doesn't exist"
@@ -112,7 +160,10 @@ class Bot(EventHandler):
         """
         for i in self._on_startup_sync:
             i()
-        asyncio.get_event_loop().run_until_complete(asyncio.gather(*(i() for i in self._on_startup_async)))
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(asyncio.gather(*(i() for i in self._on_startup_async)))
+        # connections are bound to the loop, so they are released before the server starts its own one
+        loop.run_until_complete(self.session.close())
         self.server.listen()
 
     def on_startup(self, func):
@@ -143,7 +194,10 @@ class Bot(EventHandler):
                 names: list[str] = None,
                 access_level: AccessLevel = AccessLevel.USER,
                 message_if_deny: str = None,
-                use_doc=False):
+                use_doc=False,
+                execution: ExecutionMode = ExecutionMode.THREAD,
+                max_concurrency: int | None = None,
+                timeout: float | None = None):
         """
         Decorator, that converts function to the Command-object
 
@@ -153,6 +207,9 @@ class Bot(EventHandler):
             access_level: minimal access level of user to use command
             message_if_deny: text, that will be sent to user if his access_level less than command's access_level
             use_doc:
+            execution: where synchronous function is executed
+            max_concurrency: maximum number of simultaneous executions of the command
+            timeout: seconds, after which execution of the command is abandoned
         """
 
         def wrapper(func: Callable[[...], Awaitable] | Callable[[...], str | None]) -> 'Command':
@@ -166,7 +223,9 @@ class Bot(EventHandler):
             kwargs = {}
             if message_if_deny is not None:
                 kwargs['message_if_deny'] = message_if_deny
-            self.add_command(command := Command(func, name, names, access_level, use_doc=use_doc, **kwargs))
+            self.add_command(command := Command(func, name, names, access_level, use_doc=use_doc,
+                                                execution=execution, max_concurrency=max_concurrency,
+                                                timeout=timeout, **kwargs))
             return command
 
         return wrapper
@@ -179,6 +238,88 @@ class Bot(EventHandler):
         return wrapper
 
 
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text to words like shell does (quoted text is one word)
+
+    Raises:
+        ValueError: if quotes are not closed
+    """
+    if '"' not in text and "'" not in text and '\\' not in text:
+        return text.split()
+    return shlex.split(text)
+
+
+class CommandParser:
+    """
+    Converts words of the message to the arguments of the command-function
+
+    Parameters are analysed once, so parsing of every message is just a pass over its words:
+    words are assigned to parameters in order, missing parameters get their default values (or None),
+    `dict`-parameter takes all remaining words in format key=value
+    """
+
+    def __init__(self, signature: inspect.Signature):
+        """
+        Args:
+            signature: signature of the command-function
+        """
+        self.parameters: list[tuple[str, Callable[[str], Any], Any]] = []
+        self.dict_parameter: tuple[str, Any] | None = None
+        for name, param in signature.parameters.items():
+            if name == 'message':
+                continue
+            if self.dict_parameter is not None:
+                raise ValueError(f'Parameter {name} can\'t follow dict-parameter')
+            annotation = param.annotation
+            if annotation is param.empty:
+                annotation = str
+            if isinstance(annotation, type) and issubclass(annotation, dict):
+                self.dict_parameter = name, param.default
+                continue
+            default = None if param.default is param.empty else param.default
+            if default is not None:
+                try:
+                    # defaults are converted as if they were written in the message
+                    default = annotation(str(default))
+                except (TypeError, ValueError):
+                    pass
+            self.parameters.append((name, annotation, default))
+
+    def parse(self, words: list[str]) -> dict[str, Any]:
+        """
+        Args:
+            words: words of the message after the name of the command
+
+        Returns:
+            arguments for the command-function by their names
+
+        Raises:
+            ValueError: if words doesn't match parameters
+        """
+        if len(words) > len(self.parameters) and self.dict_parameter is None:
+            raise ValueError(f'Unexpected arguments: {words[len(self.parameters):]}')
+        args = {}
+        for i, (name, converter, default) in enumerate(self.parameters):
+            args[name] = converter(words[i]) if i < len(words) else default
+        if self.dict_parameter is not None:
+            name, default = self.dict_parameter
+            if rest := words[len(self.parameters):]:
+                args[name] = dict(self._split_pair(word) for word in rest)
+            elif default is not inspect.Parameter.empty:
+                args[name] = default
+            else:
+                raise ValueError(f'Missing argument {name}')
+        return args
+
+    @staticmethod
+    def _split_pair(word: str) -> tuple[str, str]:
+        key, sep, value = word.partition('=')
+        if not sep:
+            raise ValueError(f'{word} is not in format key=value')
+        return key, value
+
+
 class Command:
     """
     Class, that added to func-commands features as:
@@ -194,7 +335,10 @@ class Command:
                  access_level: AccessLevel = AccessLevel.USER,
                  message_if_deny: str = 'Access denied',
                  use_doc: bool = False,
-                 on_event: EventType = EventType.MESSAGE_NEW):
+                 on_event: EventType = EventType.MESSAGE_NEW,
+                 execution: ExecutionMode = ExecutionMode.THREAD,
+                 max_concurrency: int | None = None,
+                 timeout: float | None = None):
         """
         Args:
             func: function that will be converted into Command-object
@@ -202,6 +346,9 @@ class Command:
             aliases: additional names of the command
             access_level: minimal access level of user to use command
             message_if_deny: text, that will be sent to user if his access_level less than command's access_level
+            execution: where synchronous function is executed (ignored for coroutine functions)
+            max_concurrency: maximum number of simultaneous executions of the command
+            timeout: seconds, after which execution of the command is abandoned
         """
         self.bot_admin = 0
         if aliases is None:
@@ -215,30 +362,19 @@ class Command:
         self._func = func
         self.aliases = aliases
         self.access_level = access_level
-        parser = ArgumentParser(description=f'Command {self.name}', exit_on_error=False)
-        self._use_message = False
-        for name, param in inspect.signature(self).parameters.items():
-            if name == 'message':
-                self._use_message = True
-                continue
-            annotation = param.annotation
-            if param.annotation is param.empty:
-                annotation = str
-                # {"-" if parameter.default is not parameter.empty else ""}
-            kwargs = {'type': annotation, 'nargs': '?'}
-            if param.default is not param.empty:
-                kwargs |= {'default': str(param.default)}
-            if isinstance(annotation(), dict):
-                kwargs['action'] = StoreDict
-                kwargs['nargs'] = '+'
-                del kwargs['type']
-            arg = parser.add_argument(f'{name}',
-                                      **kwargs
-                                      )
-            # print(arg)
-        # parser.print_help(sys.stdout)
+        self._use_message = 'message' in inspect.signature(self).parameters
+        self.parser = CommandParser(inspect.signature(self))
         self.__is_coroutine = asyncio.iscoroutinefunction(func)
-        self.parser = parser
+        if execution is ExecutionMode.PROCESS:
+            if self.__is_coroutine:
+                raise ValueError('Coroutine function can\'t be executed in process pool')
+            if self._use_message:
+                raise ValueError('Message can\'t be passed to command executed in process pool')
+            if '<locals>' in func.__qualname__:
+                raise ValueError('Only module level functions can be executed in process pool')
+        self.execution = execution
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency is not None else None
         self.names = [self.name, *self.aliases]
         self.help = self._convert_signature_to_help(use_doc)
         self.short_help = self.name + (f'({", ".join(self.aliases)})' if self.aliases else '')
@@ -260,23 +396,75 @@ class Command:
             user_access_level = AccessLevel.USER
         return user_access_level >= self.access_level
 
-    async def __call__(self, message: Message) -> str | None:
+    async def __call__(self, message: Message, arguments: list[str] | None = None) -> str | None:
+        """
+        Args:
+            message: message, witch fires the command
+            arguments: tokens of the message after the name of the command (message is tokenized if not passed)
+        """
         if self._check_permissions(message):
             try:
-                # self.parser.print_help(sys.stdout)
-                args = vars(self.parser.parse_args(shlex.split(message.text)[1:]))
-                if self._use_message:
-                    args['message'] = message
-                if self.__is_coroutine:
-                    result = await self._func(**args)
-                else:
-                    result = self._func(**args)
-                return result
-            except SystemExit:
+                if arguments is None:
+                    arguments = tokenize(message.text)[1:]
+                args = self.parser.parse(arguments)
+            except ValueError:
                 return f'Invalid arguments for command {self.name}'
+            if self._use_message:
+                args['message'] = message
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout if self.timeout is not None else None
+            if self._semaphore is not None:
+                try:
+                    await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+                except asyncio.TimeoutError:
+                    return f'Command {self.name} timed out'
+            try:
+                execution = self._execute(args)
+            except BaseException:
+                if self._semaphore is not None:
+                    self._semaphore.release()
+                raise
+            # threads and processes can't be interrupted, so the slot of the command is released only
+            # when the execution is actually finished, not when it is abandoned
+            if self._semaphore is not None:
+                execution.add_done_callback(lambda _: self._semaphore.release())
+            try:
+                return await asyncio.wait_for(asyncio.shield(execution),
+                                              deadline - loop.time() if deadline is not None else None)
+            except asyncio.TimeoutError:
+                self._abandon(execution)
+                return f'Command {self.name} timed out'
+            except asyncio.CancelledError:
+                self._abandon(execution)
+                raise
         elif self.message_if_deny:
             return self.message_if_deny
 
+    def _execute(self, args: dict) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if self.__is_coroutine:
+            return asyncio.ensure_future(self._func(**args))
+        match self.execution:
+            case ExecutionMode.THREAD:
+                return loop.run_in_executor(_get_thread_pool(), partial(self._func, **args))
+            case ExecutionMode.PROCESS:
+                return loop.run_in_executor(_get_process_pool(),
+                                            partial(_call_in_process, self.__module__, self.__qualname__, args))
+            case _:
+                future = loop.create_future()
+                try:
+                    future.set_result(self._func(**args))
+                except Exception as e:
+                    future.set_exception(e)
+                return future
+
+    def _abandon(self, execution: asyncio.Future):
+        if self.__is_coroutine:
+            execution.cancel()
+        else:
+            # the result is dropped, but the exception is retrieved, so it isn't reported as never retrieved
+            execution.add_done_callback(lambda future: future.cancelled() or future.exception())
+
     def _convert_signature_to_help(self, use_doc: bool = False) -> str:
         """
         Converting the signature of the command function to the help-string, that will be used by standard help-command
@@ -326,17 +514,24 @@ class Command:
 
 
 class CommandHandler:
-    def __init__(self, bot_admin):
+    def __init__(self, bot_admin, prefix_matching: bool = True):
+        """
+        Args:
+            bot_admin: id of user, who will have maximum access_level
+            prefix_matching: whether commands can be called by unambiguous prefixes of their names
+        """
         self.bot_admin = bot_admin
         self._aliases: dict[str, Command] = {}
+        self._router: CommandRouter[Command] = CommandRouter(prefix_matching)
 
     def add_command(self, command: Command):
         for name in command.names:
-            if name in self._aliases:
+            if name in self._router:
                 raise ValueError(f"Command with alias {name} already exist")
         command.bot_admin = self.bot_admin
         for name in command.names:
             self._aliases[name] = command
+            self._router.add(name, command)
 
     @property
     def commands(self) -> set[Command]:
@@ -347,22 +542,30 @@ class CommandHandler:
         return self._aliases.keys()
 
     def __getitem__(self, item: str) -> Command:
-        return self._aliases[item]
+        return self._router[item]
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._router
 
     def __iter__(self):
         return iter(self.commands)
 
     async def handle_command(self, message: Message):
-        command_name = message.text[1:].split()[0]
         try:
-            command = self[command_name]
-        except KeyError:
-            return f'There is no command {command_name}'
+            tokens = tokenize(message.text[1:])
+        except ValueError:
+            # unclosed quotes
+            tokens = message.text[1:].split()
+        if (resolved := self._router.resolve(tokens)) is None:
+            if (suggestion := self._router.suggest(tokens[0])) is not None:
+                return f'There is no command {tokens[0]}. Did you mean {suggestion}?'
+            return f'There is no command {tokens[0]}'
+        command, name_length = resolved
         try:
-            return await command(message)
+            return await command(message, tokens[name_length:])
         except Exception as e:
             logging.exception(e)
-            return f'An exception has occurred in "{command_name}" execution'
+            return f'An exception has occurred in "{command.name}" execution'
 
 
 class Regex:
@@ -371,21 +574,63 @@ class Regex:
         update_wrapper(self, func)
         self._func = func
 
+    def match(self, text: str) -> re.Match | None:
+        return self.regex.match(text)
+
+    async def handle(self, message: Message):
+        """
+        Calls the function without checking the message
+        """
+        await self._func(message)
+
     async def __call__(self, message: Message):
-        if re.match(self.regex, message.text):
+        if self.match(message.text):
             await self._func(message)
 
 
+_BACKREFERENCE = re.compile(r'\\\d|\(\?P=')
+
+
 class RegexHandler:
+    """
+    Calls Regex-objects, that match the message
+
+    Patterns are joined into one alternation, so messages, that match none of them, are checked by one pass
+    """
+
     def __init__(self):
-        self.regexes = []
+        self.regexes: list[Regex] = []
+        # regexes, that are the part of the joined pattern
+        self._joined_regexes: list[Regex] = []
+        self._joined: re.Pattern | None = None
+        # regexes, that can't be joined (e.g. because of backreferences or conflicting group names)
+        self._separate_regexes: list[Regex] = []
 
     def add_regex(self, regex: Regex):
         self.regexes.append(regex)
+        if not _BACKREFERENCE.search(regex.regex.pattern):
+            patterns = [*(r.regex.pattern for r in self._joined_regexes), regex.regex.pattern]
+            try:
+                self._joined = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+                self._joined_regexes.append(regex)
+                return
+            except re.error:
+                pass
+        self._separate_regexes.append(regex)
+
+    def match(self, text: str) -> list[Regex]:
+        """
+        Returns:
+            regexes, that match the text
+        """
+        matched = []
+        if self._joined is not None and self._joined.match(text):
+            matched += [r for r in self._joined_regexes if r.match(text)]
+        matched += [r for r in self._separate_regexes if r.match(text)]
+        return matched
 
     async def handle_regex(self, message: Message):
-        tasks = []
-        for r in self.regexes:
-            tasks.append(asyncio.create_task(r(message)))
+        tasks = [asyncio.create_task(r.handle(message)) for r in self.match(message.text)]
         for t in tasks:
             await t
+
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+import typing
+from random import randint
+from typing import AsyncIterator, Iterable
+
+from vkpybot.errors import is_transient
+from vkpybot.scheduler import Priority
+from vkpybot.utils import Backoff
+
+if typing.TYPE_CHECKING:
+    from vkpybot.sessions import Session
+
+
+class BroadcastState:
+    """
+    Progress of the broadcast
+
+    Broadcast can be paused and resumed through the state, and restarted with the same (or restored) state
+    to skip already processed chats
+    """
+
+    def __init__(self, done: Iterable[int] = (), sent: int = 0, failed: int = 0):
+        """
+        Args:
+            done: chats, that have been already processed
+            sent: number of delivered messages
+            failed: number of undelivered messages
+        """
+        self.done: set[int] = set(done)
+        self.sent = sent
+        self.failed = failed
+        self.started_at: float | None = None
+        self._resumed: asyncio.Event | None = None
+        self._paused = False
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def pause(self):
+        """
+        Stops sending new chunks (chunks, that are being sent, are finished)
+        """
+        self._paused = True
+        if self._resumed is not None:
+            self._resumed.clear()
+
+    def resume(self):
+        self._paused = False
+        if self._resumed is not None:
+            self._resumed.set()
+
+    async def wait_resumed(self):
+        if self._resumed is None:
+            self._resumed = asyncio.Event()
+            if not self._paused:
+                self._resumed.set()
+        await self._resumed.wait()
+
+    @property
+    def throughput(self) -> float:
+        """
+        Processed chats per second
+        """
+        if self.started_at is None:
+            return 0.
+        elapsed = time.monotonic() - self.started_at
+        return (self.sent + self.failed) / elapsed if elapsed > 0 else 0.
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            JSON-serializable checkpoint of the state
+        """
+        return {'done': sorted(self.done), 'sent': self.sent, 'failed': self.failed}
+
+    @classmethod
+    def from_dict(cls, checkpoint: dict) -> 'BroadcastState':
+        return cls(checkpoint['done'], checkpoint['sent'], checkpoint['failed'])
+
+    def __repr__(self):
+        return f'<BroadcastState sent={self.sent} failed={self.failed} {self.throughput:.1f}/s>'
+
+
+async def broadcast(session: 'Session',
+                    peers: Iterable[int],
+                    params: dict,
+                    chunk_size: int = 100,
+                    concurrency: int = 1,
+                    retries: int = 3,
+                    backoff: Backoff | None = None,
+                    state: BroadcastState | None = None,
+                    group_peers: bool = True) -> AsyncIterator[dict]:
+    """
+    Sends the same message to many chats, see Session.broadcast
+
+    Args:
+        group_peers: whether chunks of chats can be sent by one request (VK_API allows it only for groups),
+            otherwise every chat is sent by its own request
+    """
+    if not group_peers:
+        chunk_size = 1
+    if state is None:
+        state = BroadcastState()
+    if backoff is None:
+        backoff = Backoff(base=1.)
+    if state.started_at is None:
+        state.started_at = time.monotonic()
+    peers = [peer for peer in dict.fromkeys(peers) if peer not in state.done]
+    results: asyncio.Queue[dict] = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send_chunk(chunk: list[int]):
+        async with semaphore:
+            await state.wait_resumed()
+            chunk_results = await _send_chunk(session, chunk, params, retries, backoff)
+        for result in chunk_results:
+            state.done.add(result['peer_id'])
+            if 'error' in result:
+                state.failed += 1
+            else:
+                state.sent += 1
+            results.put_nowait(result)
+
+    tasks = [asyncio.create_task(send_chunk(peers[i:i + chunk_size])) for i in range(0, len(peers), chunk_size)]
+    try:
+        for _ in range(len(peers)):
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _send_chunk(session: 'Session', chunk: list[int], params: dict, retries: int, backoff: Backoff) -> list[dict]:
+    # the same random_id in all attempts protects from duplicates, if the failed request was actually delivered
+    params = params | {'random_id': randint(1, 2147123123)}
+    if len(chunk) == 1:
+        params['peer_id'] = chunk[0]
+    else:
+        params['peer_ids'] = ','.join(map(str, chunk))
+    for attempt in range(retries + 1):
+        try:
+            response = await session.method('messages.send', params, Priority.BULK, retries=0)
+            break
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                logging.exception(e)
+                return [{'peer_id': peer_id, 'error': str(e)} for peer_id in chunk]
+            await asyncio.sleep(backoff.delay(attempt))
+    if len(chunk) == 1:
+        # with peer_id VK_API returns only id of the message
+        response = [{'peer_id': chunk[0], 'message_id': response}]
+    delivered = {result['peer_id']: result for result in response}
+    return [delivered.get(peer_id, {'peer_id': peer_id, 'error': 'No delivery result'}) for peer_id in chunk]
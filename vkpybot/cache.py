@@ -0,0 +1,197 @@
+import collections
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Hashable, Iterator
+
+
+class CacheStats:
+    """
+    Counters of the cache usage
+    """
+
+    def __init__(self):
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    def __str__(self):
+        return f'hits={self.hits} misses={self.misses} evictions={self.evictions} expirations={self.expirations}'
+
+    def __repr__(self):
+        return f'<CacheStats {self}>'
+
+
+class Cache(ABC):
+    """
+    Interface of caches, that are used by Session
+
+    Implementations must update `stats`
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns cached value or `default` if there is no such key
+        """
+
+    @abstractmethod
+    def __setitem__(self, key: Hashable, value: Any):
+        pass
+
+    @abstractmethod
+    def __delitem__(self, key: Hashable):
+        pass
+
+    @abstractmethod
+    def __contains__(self, key: Hashable) -> bool:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def values(self) -> Iterator[Any]:
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class LRUCache(Cache):
+    """
+    In-memory cache with bounded size and time to live of the entries
+
+    Least recently used entries are evicted when the size exceeds `maxsize`
+    """
+
+    def __init__(self, maxsize: int | None = 1024, ttl: float | None = None):
+        """
+        Args:
+            maxsize: maximum number of entries (None for unbounded)
+            ttl: seconds after which entry is expired (None for no expiration)
+        """
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: collections.OrderedDict[Hashable, tuple[Any, float]] = collections.OrderedDict()
+
+    def _expired(self, key: Hashable) -> bool:
+        if self.ttl is not None and self._data[key][1] <= time.monotonic():
+            del self._data[key]
+            self.stats.expirations += 1
+            return True
+        return False
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data or self._expired(key):
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        self._data.move_to_end(key)
+        return self._data[key][0]
+
+    def __setitem__(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else 0.
+        self._data[key] = value, expires
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def __delitem__(self, key: Hashable):
+        del self._data[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data and not self._expired(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def values(self) -> Iterator[Any]:
+        return (value for value, _ in self._data.values())
+
+    def clear(self):
+        self._data.clear()
+
+    def __repr__(self):
+        return f'<LRUCache {len(self)}/{self.maxsize} {self.stats}>'
+
+
+class SQLiteCache(Cache):
+    """
+    Persistent cache in the SQLite database with bounded size, that survives restarts
+
+    Keys are stored as strings and values as JSON, least recently used entries are evicted
+    when the size exceeds `maxsize`
+    """
+
+    def __init__(self, path: str | os.PathLike, maxsize: int | None = 10000, table: str = 'cache'):
+        """
+        Args:
+            path: path to the database
+            maxsize: maximum number of entries (None for unbounded)
+            table: name of the table (e.g. to keep several caches in one database)
+        """
+        super().__init__()
+        if not table.isidentifier():
+            raise ValueError(f'Invalid table name: {table!r}')
+        self.maxsize = maxsize
+        self.table = table
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                                     f'(key TEXT PRIMARY KEY, value TEXT NOT NULL, used_at REAL NOT NULL)')
+            self._connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_used_at ON {table} (used_at)')
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        row = self._connection.execute(f'SELECT value FROM {self.table} WHERE key = ?', (str(key),)).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        with self._connection:
+            self._connection.execute(f'UPDATE {self.table} SET used_at = ? WHERE key = ?', (time.time(), str(key)))
+        return json.loads(row[0])
+
+    def __setitem__(self, key: Hashable, value: Any):
+        with self._connection:
+            self._connection.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, used_at) VALUES (?, ?, ?)',
+                                     (str(key), json.dumps(value), time.time()))
+            if self.maxsize is not None and (excess := len(self) - self.maxsize) > 0:
+                self._connection.execute(f'DELETE FROM {self.table} WHERE key IN '
+                                         f'(SELECT key FROM {self.table} ORDER BY used_at LIMIT ?)', (excess,))
+                self.stats.evictions += excess
+
+    def __delitem__(self, key: Hashable):
+        with self._connection:
+            if not self._connection.execute(f'DELETE FROM {self.table} WHERE key = ?', (str(key),)).rowcount:
+                raise KeyError(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._connection.execute(f'SELECT 1 FROM {self.table} WHERE key = ?', (str(key),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def values(self) -> Iterator[Any]:
+        return (json.loads(value) for value, in self._connection.execute(f'SELECT value FROM {self.table}'))
+
+    def clear(self):
+        with self._connection:
+            self._connection.execute(f'DELETE FROM {self.table}')
+
+    def close(self):
+        self._connection.close()
+
+    def __repr__(self):
+        return f'<SQLiteCache {len(self)}/{self.maxsize} {self.stats}>'
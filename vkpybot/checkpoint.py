@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+
+
+class CheckpointStore(ABC):
+    """
+    Persists `ts` of the last acknowledged long poll event, so the bot can resume from it after restart
+
+    Saved values are written not more often than once in `flush_interval` seconds
+    """
+
+    def __init__(self, flush_interval: float = 1.):
+        """
+        Args:
+            flush_interval: minimal number of seconds between writes (0 to write every value)
+        """
+        self.flush_interval = flush_interval
+        self._ts: str | None = None
+        self._dirty = False
+        self._flushed_at = 0.
+
+    def load(self) -> str | None:
+        """
+        Returns:
+            last saved ts or None if there is no checkpoint
+        """
+        return self._read()
+
+    def save(self, ts: str | int):
+        """
+        Remembers ts and writes it, if `flush_interval` has passed since the last write
+        """
+        self._ts = str(ts)
+        self._dirty = True
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the last saved ts
+        """
+        if self._dirty:
+            self._write(self._ts)
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    @abstractmethod
+    def _read(self) -> str | None:
+        pass
+
+    @abstractmethod
+    def _write(self, ts: str):
+        pass
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    Keeps checkpoint in the text file
+    """
+
+    def __init__(self, path: str | os.PathLike, flush_interval: float = 1.):
+        """
+        Args:
+            path: path to the file
+            flush_interval: minimal number of seconds between writes
+        """
+        super().__init__(flush_interval)
+        self.path = path
+
+    def _read(self) -> str | None:
+        try:
+            with open(self.path) as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write(self, ts: str):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as file:
+            file.write(ts)
+        # replacing is atomic, so the checkpoint can't be corrupted by crash during the write
+        os.replace(tmp, self.path)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    Keeps checkpoints in the SQLite database, one row per `name`
+    """
+
+    def __init__(self, path: str | os.PathLike, name: str = 'default', flush_interval: float = 1.):
+        """
+        Args:
+            path: path to the database
+            name: name of the checkpoint (e.g. to keep checkpoints of several bots in one database)
+            flush_interval: minimal number of seconds between writes
+        """
+        super().__init__(flush_interval)
+        self.name = name
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, ts TEXT NOT NULL)')
+        self._connection.commit()
+
+    def _read(self) -> str | None:
+        row = self._connection.execute('SELECT ts FROM checkpoints WHERE name = ?', (self.name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _write(self, ts: str):
+        with self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO checkpoints (name, ts) VALUES (?, ?)', (self.name, ts))
+
+    def close(self):
+        super().close()
+        self._connection.close()
@@ -0,0 +1,226 @@
+import asyncio
+import collections
+import enum
+import logging
+from typing import Awaitable, Callable, Hashable, Iterable
+
+
+class OverflowPolicy(enum.Enum):
+    """
+    Defines what EventDispatcher does with new event, when its queue is full
+    """
+    # wait until there is free space in the queue
+    BLOCK = enum.auto()
+    # drop the oldest queued event
+    DROP_OLDEST = enum.auto()
+    # drop the oldest queued event of droppable type (or the new one if it is droppable), otherwise wait
+    DROP_BY_TYPE = enum.auto()
+
+
+def by_peer(event: dict) -> Hashable | None:
+    """
+    Ordering key, that serializes events of the same chat
+    """
+    obj = event.get('object', {})
+    return obj.get('message', obj).get('peer_id')
+
+
+def by_user(event: dict) -> Hashable | None:
+    """
+    Ordering key, that serializes events of the same user
+    """
+    obj = event.get('object', {})
+    obj = obj.get('message', obj)
+    return obj.get('from_id', obj.get('user_id'))
+
+
+class EventDispatcher:
+    """
+    Bounded queue of events, that are handled by limited number of workers
+
+    Events with the same ordering key (e.g. from the same chat) are handled one by one in order of their arrival,
+    events with different keys are handled in parallel, keys take turns in round-robin order
+    """
+
+    def __init__(self,
+                 handler: Callable[[dict], Awaitable],
+                 max_concurrency: int = 100,
+                 max_queue: int = 1000,
+                 overflow: OverflowPolicy = OverflowPolicy.BLOCK,
+                 droppable_types: Iterable[str] = ('message_typing_state',),
+                 ordering: Callable[[dict], Hashable | None] | None = by_peer,
+                 max_key_queue: int = 100):
+        """
+        Args:
+            handler: coroutine function, that handles raw event from VK_API
+            max_concurrency: maximum number of events, that are handled simultaneously
+            max_queue: maximum number of events, that are waiting to be handled
+            overflow: what to do with new event, when the queue is full
+            droppable_types: types of events, that can be dropped with OverflowPolicy.DROP_BY_TYPE
+            ordering: function, that returns the key of the event, events with the same key are handled in order
+                (events with None key and all events if ordering is None are handled independently)
+            max_key_queue: maximum number of waiting events with the same key
+        """
+        self._handler = handler
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.droppable_types = frozenset(droppable_types)
+        self.ordering = ordering
+        self.max_key_queue = max_key_queue
+        self.dropped: collections.Counter[str] = collections.Counter()
+        self.handled: int = 0
+        self._queues: dict[Hashable, collections.deque[tuple[dict, asyncio.Future]]] = {}
+        # keys, that have waiting events and are not being handled now
+        self._ready: collections.deque[Hashable] = collections.deque()
+        # keys, that are either ready or being handled
+        self._scheduled: set[Hashable] = set()
+        self._size: int = 0
+        self._active: int = 0
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._not_empty: asyncio.Event | None = None
+        self._not_full: asyncio.Event | None = None
+        self._idle: asyncio.Event | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of events, that are waiting to be handled
+        """
+        return self._size
+
+    @property
+    def active(self) -> int:
+        """
+        Number of events, that are being handled now
+        """
+        return self._active
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._not_empty, self._not_full, self._idle = asyncio.Event(), asyncio.Event(), asyncio.Event()
+        self._idle.set()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+
+    async def put(self, event: dict) -> asyncio.Future:
+        """
+        Adds raw event from VK_API to the queue, applying the overflow policy if it is full
+
+        Returns:
+            future, that is resolved with True when the event is handled or with False if it is dropped
+        """
+        self._start()
+        done = self._loop.create_future()
+        key = self.ordering(event) if self.ordering is not None else None
+        if key is None:
+            key = object()
+        while True:
+            queue = self._queues.get(key)
+            if queue is not None and len(queue) >= self.max_key_queue:
+                victims = [queue]
+            elif self._size >= self.max_queue:
+                victims = [queue for queue in self._queues.values() if queue]
+            else:
+                break
+            if self.overflow is OverflowPolicy.DROP_OLDEST:
+                self._drop(victims[0], victims[0][0])
+            elif self.overflow is OverflowPolicy.DROP_BY_TYPE and (victim := self._droppable(victims)) is not None:
+                self._drop(*victim)
+            elif self.overflow is OverflowPolicy.DROP_BY_TYPE and event.get('type') in self.droppable_types:
+                self._count_drop(event)
+                done.set_result(False)
+                return done
+            else:
+                self._not_full.clear()
+                await self._not_full.wait()
+        self._queues.setdefault(key, collections.deque()).append((event, done))
+        self._size += 1
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._ready.append(key)
+        self._idle.clear()
+        self._not_empty.set()
+        return done
+
+    def _droppable(self, queues: list[collections.deque]) -> tuple[collections.deque, tuple] | None:
+        for queue in queues:
+            for item in queue:
+                if item[0].get('type') in self.droppable_types:
+                    return queue, item
+        return None
+
+    def _drop(self, queue: collections.deque, item: tuple[dict, asyncio.Future]):
+        queue.remove(item)
+        self._size -= 1
+        event, done = item
+        self._count_drop(event)
+        done.set_result(False)
+
+    def _count_drop(self, event: dict):
+        self.dropped[event.get('type')] += 1
+        logging.warning(f'Event queue is full, {event.get("type")} event is dropped')
+
+    async def _work(self):
+        while True:
+            while not self._ready:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            key = self._ready.popleft()
+            queue = self._queues[key]
+            if not queue:
+                # all events of the key were dropped
+                self._release(key)
+                continue
+            event, done = queue.popleft()
+            self._size -= 1
+            self._not_full.set()
+            self._active += 1
+            # the handler runs in its own task, so even CancelledError raised by the handler
+            # fails only this event and doesn't stop the worker
+            handling = asyncio.ensure_future(self._handler(event))
+            try:
+                await asyncio.wait({handling})
+                if handling.cancelled():
+                    logging.error(f'Handling of {event.get("type")} event was cancelled')
+                elif (error := handling.exception()) is not None:
+                    logging.exception(error, exc_info=error)
+            except asyncio.CancelledError:
+                # the worker itself is cancelled
+                handling.cancel()
+                raise
+            finally:
+                self._active -= 1
+                self.handled += 1
+                done.set_result(True)
+                if queue:
+                    self._ready.append(key)
+                    self._not_empty.set()
+                else:
+                    self._release(key)
+                if not self._size and not self._active:
+                    self._idle.set()
+
+    def _release(self, key: Hashable):
+        self._scheduled.discard(key)
+        del self._queues[key]
+
+    async def join(self):
+        """
+        Waits until all queued events are handled
+        """
+        if self._idle is not None and self._loop is asyncio.get_running_loop():
+            await self._idle.wait()
+
+    async def close(self):
+        """
+        Waits for queued events and stops the workers
+        """
+        await self.join()
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._loop = None
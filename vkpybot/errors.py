@@ -0,0 +1,144 @@
+import asyncio
+
+import aiohttp
+
+
+class VKAPIError(Exception):
+    """
+    Error, returned by VK_API
+
+    Errors with known codes are raised as subclasses of VKAPIError (see `from_response`)
+    """
+    # error_code, that is represented by the class
+    code: int | None = None
+    _by_code: dict[int, type['VKAPIError']] = {}
+
+    def __init_subclass__(cls, code: int | None = None, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if code is not None:
+            cls.code = code
+            VKAPIError._by_code[code] = cls
+
+    def __init__(self, code: int, message: str, params: dict | None = None, details: dict | None = None):
+        """
+        Args:
+            code: error_code from VK_API
+            message: error_msg from VK_API
+            params: params of the failed request (access_token is removed)
+            details: whole `error` object from VK_API
+        """
+        super().__init__(f'code {code}: {message}')
+        self.code = code
+        self.message = message
+        self.params = {key: value for key, value in (params or {}).items() if key != 'access_token'}
+        self.details = details if details is not None else {}
+
+    @classmethod
+    def from_response(cls, error: dict, params: dict | None = None) -> 'VKAPIError':
+        """
+        Creates exception of the class, that corresponds to error_code,
+        from the `error` object of the response (or item of `execute_errors`)
+
+        Args:
+            error: `error` object from VK_API
+            params: params of the failed request (request_params of the error are used by default)
+        """
+        if params is None and 'request_params' in error:
+            params = {param['key']: param['value'] for param in error['request_params']}
+        error_class = VKAPIError._by_code.get(error['error_code'], VKAPIError)
+        return error_class(error['error_code'], error['error_msg'], params, error)
+
+
+class UnknownError(VKAPIError, code=1):
+    pass
+
+
+class UnknownMethodError(VKAPIError, code=3):
+    pass
+
+
+class AuthorizationError(VKAPIError, code=5):
+    """
+    Access token is invalid or expired
+    """
+
+
+class TooManyRequestsError(VKAPIError, code=6):
+    pass
+
+
+class PermissionDeniedError(VKAPIError, code=7):
+    pass
+
+
+class FloodControlError(VKAPIError, code=9):
+    pass
+
+
+class InternalServerError(VKAPIError, code=10):
+    pass
+
+
+class CaptchaNeededError(VKAPIError, code=14):
+    """
+    VK_API requires to solve the captcha, request should be repeated with captcha_sid and captcha_key
+    """
+
+    @property
+    def captcha_sid(self) -> str | None:
+        return self.details.get('captcha_sid')
+
+    @property
+    def captcha_img(self) -> str | None:
+        """
+        url of the image of the captcha
+        """
+        return self.details.get('captcha_img')
+
+
+class AccessDeniedError(VKAPIError, code=15):
+    pass
+
+
+class InvalidParameterError(VKAPIError, code=100):
+    pass
+
+
+class RecipientBlockedError(VKAPIError, code=900):
+    """
+    Can't send message to the user, that is in the blacklist
+    """
+
+
+class MessagesNotAllowedError(VKAPIError, code=901):
+    """
+    Can't send message to the user, that doesn't allow messages from the group
+    """
+
+
+class PrivacySettingsError(VKAPIError, code=902):
+    """
+    Can't send message to the user because of their privacy settings
+    """
+
+
+class QueueTimeoutError(asyncio.TimeoutError):
+    """
+    Request has waited for its turn in the rate limiter longer than `max_wait` (it wasn't sent)
+    """
+
+
+# too many requests per second, flood control, internal server error
+TRANSIENT_ERROR_CODES = frozenset({6, 9, 10})
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Checks if the request, that failed with the error, can succeed when retried
+    """
+    if isinstance(error, VKAPIError):
+        return error.code in TRANSIENT_ERROR_CODES
+    if isinstance(error, QueueTimeoutError):
+        # retry would only wait in the same queue again
+        return False
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
@@ -1,5 +1,8 @@
 import enum
+import functools
+import inspect
 import typing
+from typing import Callable
 
 if typing.TYPE_CHECKING:
     from vkpybot.types import Message, User
@@ -41,7 +44,7 @@ class EventHandler:
             EventType.LIKE_REMOVE: self.on_like_remove,
             EventType.BOARD_POST_NEW: self.on_board_post_new,
             EventType.BOARD_POST_EDIT: self.on_board_post_edit,
-            EventType.BOARD_POST_RESTORE: self.on_board_post_delete,
+            EventType.BOARD_POST_RESTORE: self.on_board_post_restore,
             EventType.BOARD_POST_DELETE: self.on_board_post_delete
         }
 
@@ -49,6 +52,21 @@ class EventHandler:
         if event in self.__event_handler:
             await self.__event_handler[event](**context)
 
+    def get_handler(self, event: 'EventType') -> Callable | None:
+        """
+        Returns:
+            method, that handles events of the type
+        """
+        return self.__event_handler.get(event)
+
+    def handled_events(self) -> set['EventType']:
+        """
+        Returns:
+            types of events, which handlers are overridden (the others are ignored)
+        """
+        return {event for event, handler in self.__event_handler.items()
+                if getattr(type(self), handler.__name__) is not getattr(EventHandler, handler.__name__)}
+
     async def on_message_new(self, message: 'Message', client_info: dict):
         pass
 
@@ -201,3 +219,98 @@ class EventType(enum.Enum):
     BOARD_POST_RESTORE = enum.auto()
 
     BOARD_POST_DELETE = enum.auto()
+
+
+class EventSchema:
+    """
+    Describes how the context of the event is built from its `object`
+
+    If `wrap` is passed, the whole object is passed as this field, and only `extract` keys are passed separately,
+    otherwise all keys of the object are passed (renamed by `rename`).
+    Fields of `users` and `message` require requests to VK_API, so they are built only for handlers,
+    that have parameters with these names
+    """
+    __slots__ = ('wrap', 'extract', 'rename', 'users', 'message')
+
+    def __init__(self,
+                 wrap: str | None = None,
+                 extract: tuple[str, ...] = (),
+                 rename: dict[str, str] | None = None,
+                 users: dict[str, str] | None = None,
+                 message: str | None = None):
+        """
+        Args:
+            wrap: name of the field with the whole object
+            extract: keys of the object, that are passed as separate fields with wrapped object
+            rename: names of the fields by keys of the object
+            users: keys of the object with ids of users by the names of the fields with these users
+            message: key of the object with the message ('' if the object is the message itself)
+        """
+        self.wrap = wrap
+        self.extract = extract
+        self.rename = rename or {}
+        self.users = users or {}
+        self.message = message
+
+    def unpack(self, obj: dict) -> dict:
+        """
+        Returns:
+            fields of the context, that don't require requests to VK_API
+        """
+        if self.wrap is not None:
+            return {self.wrap: obj} | {key: obj[key] for key in self.extract if key in obj}
+        context = {self.rename.get(key, key): value for key, value in obj.items()}
+        if self.message:
+            del context[self.message]
+        return context
+
+
+_MESSAGE = EventSchema(message='')
+_COMMENT_DELETE = EventSchema(rename={'id': 'comment_id'}, users={'user': 'user_id', 'deleter': 'deleter_id'})
+_LIKE = EventSchema(users={'liker': 'liker_id'})
+
+EVENT_SCHEMAS: dict[EventType, EventSchema] = {
+    EventType.MESSAGE_NEW: EventSchema(message='message'),
+    EventType.MESSAGE_REPLY: _MESSAGE,
+    EventType.MESSAGE_EDIT: _MESSAGE,
+    EventType.MESSAGE_ALLOW: EventSchema(users={'user': 'user_id'}),
+    EventType.MESSAGE_DENY: EventSchema(users={'user': 'user_id'}),
+    EventType.MESSAGE_TYPING_STATE: EventSchema(users={'sender': 'from_id'}),
+    EventType.MESSAGE_EVENT: EventSchema(users={'user': 'user_id'}),
+    EventType.PHOTO_NEW: EventSchema(wrap='photo'),
+    **dict.fromkeys((EventType.PHOTO_COMMENT_NEW, EventType.PHOTO_COMMENT_EDIT, EventType.PHOTO_COMMENT_RESTORE),
+                    EventSchema(wrap='comment', extract=('photo_id', 'photo_owner_id'))),
+    EventType.PHOTO_COMMENT_DELETE: _COMMENT_DELETE,
+    EventType.AUDIO_NEW: EventSchema(wrap='audio'),
+    EventType.VIDEO_NEW: EventSchema(wrap='video'),
+    **dict.fromkeys((EventType.VIDEO_COMMENT_NEW, EventType.VIDEO_COMMENT_EDIT, EventType.VIDEO_COMMENT_RESTORE),
+                    EventSchema(wrap='comment', extract=('video_id', 'video_owner_id'))),
+    EventType.VIDEO_COMMENT_DELETE: _COMMENT_DELETE,
+    EventType.WALL_POST_NEW: EventSchema(wrap='post'),
+    EventType.WALL_REPOST: EventSchema(wrap='post'),
+    **dict.fromkeys((EventType.WALL_REPLY_NEW, EventType.WALL_REPLY_EDIT, EventType.WALL_REPLY_RESTORE),
+                    EventSchema(wrap='comment', extract=('post_id', 'post_owner_id'))),
+    EventType.WALL_REPLY_DELETE: _COMMENT_DELETE,
+    EventType.LIKE_ADD: _LIKE,
+    EventType.LIKE_REMOVE: _LIKE,
+    **dict.fromkeys((EventType.BOARD_POST_NEW, EventType.BOARD_POST_EDIT, EventType.BOARD_POST_RESTORE),
+                    EventSchema(wrap='comment', extract=('topic_id', 'topic_owner_id'))),
+    EventType.BOARD_POST_DELETE: EventSchema(rename={'id': 'comment_id'}),
+}
+
+
+def handler_parameters(handler: Callable) -> tuple[frozenset[str], bool]:
+    """
+    Returns:
+        names of the parameters of the handler and whether it accepts any keyword arguments
+    """
+    # signatures are cached by functions, so cache doesn't keep bound methods with their objects
+    return _function_parameters(getattr(handler, '__func__', handler))
+
+
+@functools.lru_cache(maxsize=None)
+def _function_parameters(function: Callable) -> tuple[frozenset[str], bool]:
+    parameters = inspect.signature(function).parameters.values()
+    names = frozenset(param.name for param in parameters
+                      if param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY))
+    return names, any(param.kind is param.VAR_KEYWORD for param in parameters)
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import typing
+from random import randint
+
+from vkpybot.scheduler import Priority
+
+if typing.TYPE_CHECKING:
+    from vkpybot.sessions import Session
+
+
+class _Outgoing:
+    __slots__ = ('peer_id', 'params', 'futures', 'priority')
+
+    def __init__(self, peer_id: int, params: dict, futures: list[asyncio.Future],
+                 priority: Priority = Priority.NORMAL):
+        self.peer_id = peer_id
+        self.params = params
+        self.futures = futures
+        self.priority = priority
+
+    @property
+    def merge_key(self) -> tuple | None:
+        """
+        Messages with equal keys can be merged (e.g. plain texts or replies to the same message),
+        None if the message can't be merged (it has attachments or sticker)
+        """
+        if 'message' not in self.params or self.params.keys() & {'attachment', 'sticker_id'}:
+            return None
+        return tuple(sorted((key, repr(value)) for key, value in self.params.items() if key != 'message'))
+
+    @property
+    def payload_key(self) -> tuple:
+        return tuple(sorted((key, repr(value)) for key, value in self.params.items()))
+
+
+def split_text(text: str, max_length: int) -> list[str]:
+    """
+    Splits text to parts not longer than `max_length`, preferably by lines or words
+    """
+    parts = []
+    while len(text) > max_length:
+        cut = text.rfind('\n', 0, max_length + 1)
+        if cut <= 0:
+            cut = text.rfind(' ', 0, max_length + 1)
+        if cut <= 0:
+            cut = max_length
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n ')
+    parts.append(text)
+    return parts
+
+
+class Outbox:
+    """
+    Queue of outgoing messages, that reduces number of `messages.send` requests
+
+    Messages, that were sent within `window` seconds, are processed together:
+    - short text messages to the same chat are merged into one message (replies are merged only if they reply
+      to the same message, because message can reply to only one message)
+    - messages with the same content to different chats are sent by one request (up to 100 chats,
+      only with the token of the group, VK_API doesn't allow `peer_ids` for users)
+    - too long texts are split into several messages
+    """
+    max_peers = 100
+    max_length = 4096
+
+    def __init__(self,
+                 session: 'Session',
+                 window: float = 0.05,
+                 merge: bool = True,
+                 separator: str = '\n',
+                 group_peers: bool = True):
+        """
+        Args:
+            session: session, that sends the messages
+            window: seconds to wait for other messages before sending
+            merge: whether to merge text messages to the same chat
+            separator: string between merged texts
+            group_peers: whether to send the same message to several chats by one request (only for groups)
+        """
+        self.session = session
+        self.window = window
+        self.merge = merge
+        self.group_peers = group_peers
+        self.separator = separator
+        self._pending: list[_Outgoing] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # references to the sending tasks, so they aren't garbage-collected before they are done
+        self._tasks: set[asyncio.Task] = set()
+
+    def send(self, peer_id: int, params: dict, priority: Priority = Priority.NORMAL) -> asyncio.Future:
+        """
+        Adds the message to the queue
+
+        Args:
+            peer_id: destination of the message
+            params: params of `messages.send` except peer_id and random_id
+            priority: lane of the message, request is sent in the highest lane of its messages
+
+        Returns:
+            future with the delivery result:
+                {
+                    'peer_id': destination,
+                    'message_id': id of the message,
+                    'conversation_message_id': id of the message in the chat,
+                    'error': error if the message wasn't delivered
+                }
+            (result of the last part for split messages, the same result for merged messages)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(_Outgoing(peer_id, params, [future], priority))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        by_peer: dict[int, list[_Outgoing]] = {}
+        for message in pending:
+            by_peer.setdefault(message.peer_id, []).append(message)
+        queues = [self._split([*self._merge(messages)]) for messages in by_peer.values()]
+        task = asyncio.create_task(self._send(queues))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _merge(self, messages: list[_Outgoing]) -> typing.Iterator[_Outgoing]:
+        merged = None
+        for message in messages:
+            if (self.merge and merged is not None and merged.merge_key is not None
+                    and merged.merge_key == message.merge_key
+                    and len(merged.params['message']) + len(self.separator) + len(message.params['message'])
+                    <= self.max_length):
+                merged = _Outgoing(merged.peer_id,
+                                   merged.params | {'message': merged.params['message'] + self.separator
+                                                               + message.params['message']},
+                                   merged.futures + message.futures,
+                                   min(merged.priority, message.priority))
+                continue
+            if merged is not None:
+                yield merged
+            merged = message
+        if merged is not None:
+            yield merged
+
+    def _split(self, messages: list[_Outgoing]) -> list[_Outgoing]:
+        result = []
+        for message in messages:
+            text = message.params.get('message', '')
+            if len(text) <= self.max_length:
+                result.append(message)
+                continue
+            *parts, last = split_text(text, self.max_length)
+            result += [_Outgoing(message.peer_id, {'message': part}, [], message.priority) for part in parts]
+            result.append(_Outgoing(message.peer_id, message.params | {'message': last}, message.futures,
+                                    message.priority))
+        return result
+
+    async def _send(self, queues: list[list[_Outgoing]]):
+        # n-th messages of all chats are sent together, so the messages in every chat keep their order
+        for round_number in range(max(map(len, queues))):
+            groups: dict[tuple, list[_Outgoing]] = {}
+            for queue in queues:
+                if round_number < len(queue):
+                    message = queue[round_number]
+                    key = message.payload_key if self.group_peers else (message.peer_id,)
+                    groups.setdefault(key, []).append(message)
+            requests = []
+            for messages in groups.values():
+                for i in range(0, len(messages), self.max_peers):
+                    requests.append(self._send_group(messages[i:i + self.max_peers]))
+            await asyncio.gather(*requests)
+
+    async def _send_group(self, messages: list[_Outgoing]):
+        params = messages[0].params | {'random_id': randint(1, 2147123123)}
+        if len(messages) == 1:
+            params['peer_id'] = messages[0].peer_id
+        else:
+            params['peer_ids'] = ','.join(str(message.peer_id) for message in messages)
+        priority = min(message.priority for message in messages)
+        try:
+            response = await self.session.method('messages.send', params, priority)
+            if len(messages) == 1:
+                # with peer_id VK_API returns only id of the message
+                response = [{'peer_id': messages[0].peer_id, 'message_id': response}]
+            results = {result['peer_id']: result for result in response}
+        except Exception as e:
+            logging.exception(e)
+            for message in messages:
+                for future in message.futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for message in messages:
+            result = results.get(message.peer_id, {'peer_id': message.peer_id, 'error': 'No delivery result'})
+            for future in message.futures:
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,149 @@
+from typing import Generic, Hashable, TypeVar
+
+T = TypeVar('T', bound=Hashable)
+
+
+def levenshtein(a: str, b: str) -> int:
+    """
+    Returns:
+        minimal number of insertions, deletions and substitutions of characters to convert `a` to `b`
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Metric tree of words, that finds words within given edit distance without comparing with all of them
+    """
+
+    def __init__(self):
+        # node is a pair of the word and its children by their distance to the word
+        self._root: tuple[str, dict[int, tuple]] | None = None
+
+    def add(self, word: str):
+        if self._root is None:
+            self._root = word, {}
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = word, {}
+                return
+            node = node[1][distance]
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str]]:
+        """
+        Returns:
+            pairs of distance and word for words within `max_distance` from `word`, the closest first
+        """
+        if self._root is None:
+            return []
+        found = []
+        nodes = [self._root]
+        while nodes:
+            node_word, children = nodes.pop()
+            distance = levenshtein(word, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            # by triangle inequality only these subtrees can contain close words
+            nodes += [child for d, child in children.items() if distance - max_distance <= d <= distance + max_distance]
+        return sorted(found)
+
+
+class _TrieNode:
+    __slots__ = ('children', 'targets')
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        # targets of all names, that start with the prefix of the node
+        self.targets: set = set()
+
+
+class CommandRouter(Generic[T]):
+    """
+    Finds commands by the words of the message
+
+    Names are case-insensitive and can consist of several words (sub-commands),
+    unambiguous prefix of the name is enough to find the command
+    """
+
+    def __init__(self, prefix_matching: bool = True):
+        """
+        Args:
+            prefix_matching: whether to find commands by unambiguous prefixes of their names
+        """
+        self.prefix_matching = prefix_matching
+        self._names: dict[str, T] = {}
+        self._trie = _TrieNode()
+        self._fuzzy = BKTree()
+        self._max_words = 1
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return ' '.join(name.lower().split())
+
+    def add(self, name: str, target: T):
+        """
+        Raises:
+            ValueError: if the name is already used
+        """
+        key = self.normalize(name)
+        if key in self._names:
+            raise ValueError(f'Name {name} is already used')
+        self._names[key] = target
+        node = self._trie
+        node.targets.add(target)
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            node.targets.add(target)
+        self._fuzzy.add(key)
+        self._max_words = max(self._max_words, len(key.split()))
+
+    def __contains__(self, name: str) -> bool:
+        return self.normalize(name) in self._names
+
+    def __getitem__(self, name: str) -> T:
+        return self._names[self.normalize(name)]
+
+    def resolve(self, words: list[str]) -> tuple[T, int] | None:
+        """
+        Finds the command by the first words of the message, exact names are preferred to prefixes,
+        longer names are preferred to shorter ones
+
+        Returns:
+            command and number of words of its name or None if there is no such command
+        """
+        candidates = [self.normalize(' '.join(words[:n])) for n in range(min(self._max_words, len(words)), 0, -1)]
+        for key in candidates:
+            if key in self._names:
+                return self._names[key], len(key.split())
+        if self.prefix_matching:
+            for key in candidates:
+                node = self._trie
+                for char in key:
+                    if (node := node.children.get(char)) is None:
+                        break
+                else:
+                    if len(node.targets) == 1:
+                        return next(iter(node.targets)), len(key.split())
+        return None
+
+    def suggest(self, name: str) -> str | None:
+        """
+        Returns:
+            the closest name to the given one (if it is similar enough)
+        """
+        key = self.normalize(name)
+        found = self._fuzzy.search(key, max(1, len(key) // 3))
+        return found[0][1] if found else None
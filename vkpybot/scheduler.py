@@ -0,0 +1,367 @@
+import asyncio
+import collections
+import enum
+import json
+import time
+import typing
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+from vkpybot.errors import QueueTimeoutError, VKAPIError
+
+if typing.TYPE_CHECKING:
+    from vkpybot.sessions import Session
+
+
+class WaitStats:
+    """
+    Accumulates time, that requests have spent waiting in the queue
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.total: float = 0.
+        self.max: float = 0.
+        self.last: float = 0.
+
+    def add(self, wait: float):
+        self.count += 1
+        self.total += wait
+        self.last = wait
+        self.max = max(self.max, wait)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.
+
+    def __repr__(self):
+        return f'<WaitStats count={self.count} average={self.average:.3f}s max={self.max:.3f}s>'
+
+
+class Priority(enum.IntEnum):
+    """
+    Lane of the request in RateLimiter, lanes with lower values are served first
+    """
+    # replies to users
+    INTERACTIVE = 0
+    NORMAL = 1
+    # broadcasts, uploads and other background work
+    BULK = 2
+
+
+class RateLimiter:
+    """
+    Token bucket, that paces requests to VK_API
+
+    Besides the bucket, releases are limited by sliding window, so any second never has more than `rate` requests
+    (VK_API counts requests per second, and bursts over it fail with "Too many requests per second").
+    Requests, that exceed the rate, are queued by their priority and released as soon as tokens are refilled:
+    higher lanes are served first, requests of the same lane are served in FIFO order,
+    and bulk requests get at least `bulk_share` of the released requests while they are waiting
+    """
+
+    def __init__(self,
+                 rate: float,
+                 burst: int | None = None,
+                 max_queue: int | None = None,
+                 max_wait: float | None = None,
+                 bulk_share: float = 0.1):
+        """
+        Args:
+            rate: requests per second
+            burst: maximum number of requests, that can be made at once (1 by default, so requests are spread evenly)
+            max_queue: maximum number of waiting requests, asyncio.QueueFull is raised if it is exceeded
+            max_wait: maximum seconds to wait for the turn, QueueTimeoutError is raised if it is exceeded
+            bulk_share: minimum share of released requests, that is given to waiting bulk requests
+        """
+        if not 0 < bulk_share <= 1:
+            raise ValueError(f'bulk_share must be in (0, 1], got {bulk_share}')
+        self.rate = rate
+        self.burst = burst if burst is not None else 1
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.bulk_share = bulk_share
+        self.wait_stats = WaitStats()
+        self.lane_stats: dict[Priority, WaitStats] = {priority: WaitStats() for priority in Priority}
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # times of the last releases within the window of one second
+        self._released: collections.deque[float] = collections.deque(maxlen=max(1, int(rate)))
+        self._waiters: dict[Priority, collections.deque[asyncio.Future]] = {
+            priority: collections.deque() for priority in Priority
+        }
+        # number of requests released before waiting bulk requests since the last released bulk request
+        self._bulk_skipped = 0
+        self._release_task: asyncio.Task | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of requests, that are waiting for their turn
+        """
+        return sum(map(len, self._waiters.values()))
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self) -> float:
+        """
+        Returns:
+            seconds, after which the next request can be released (0 if it can be released now)
+        """
+        self._refill()
+        delay = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.
+        if len(self._released) == self._released.maxlen:
+            delay = max(delay, self._released[0] + 1 - self._updated)
+        return delay
+
+    def _take(self):
+        self._tokens -= 1
+        self._released.append(self._updated)
+
+    async def acquire(self, priority: Priority = Priority.NORMAL):
+        """
+        Waits until the request can be made
+
+        Args:
+            priority: lane of the request
+        """
+        start = time.monotonic()
+        if not self.queue_depth and self._delay() <= 0:
+            self._take()
+            self._add_wait(priority, 0.)
+            return
+        if self.max_queue is not None and self.queue_depth >= self.max_queue:
+            raise asyncio.QueueFull(f'{self.queue_depth} requests are already waiting')
+        waiter = asyncio.get_running_loop().create_future()
+        lane = self._waiters[priority]
+        lane.append(waiter)
+        if self._release_task is None or self._release_task.done():
+            self._release_task = asyncio.create_task(self._release())
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except BaseException as e:
+            if waiter in lane:
+                lane.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise QueueTimeoutError(f'Request has waited for its turn longer than {self.max_wait}s') from e
+            raise
+        self._add_wait(priority, time.monotonic() - start)
+
+    def _add_wait(self, priority: Priority, wait: float):
+        self.wait_stats.add(wait)
+        self.lane_stats[priority].add(wait)
+
+    def _next_lane(self) -> collections.deque[asyncio.Future]:
+        bulk = self._waiters[Priority.BULK]
+        if bulk and self._bulk_skipped + 1 >= 1 / self.bulk_share:
+            self._bulk_skipped = 0
+            return bulk
+        for lane in self._waiters.values():
+            if lane:
+                if lane is bulk:
+                    self._bulk_skipped = 0
+                elif bulk:
+                    self._bulk_skipped += 1
+                return lane
+
+    async def _release(self):
+        while self.queue_depth:
+            if (delay := self._delay()) > 0:
+                await asyncio.sleep(delay)
+                continue
+            waiter = self._next_lane().popleft()
+            if not waiter.done():
+                self._take()
+                waiter.set_result(None)
+
+
+class ExecuteBatcher:
+    """
+    Packs concurrent calls of VK_API methods into single `execute` request
+
+    Calls, that were submitted within `window` seconds, are sent together (up to 25 calls per request),
+    results and errors of every call are returned to its caller
+    """
+    max_calls = 25
+
+    def __init__(self, session: 'Session', window: float = 0.01):
+        """
+        Args:
+            session: session, that sends the requests
+            window: seconds to wait for other calls before sending the request
+        """
+        self.session = session
+        self.window = window
+        self._pending: list[tuple[str, dict, asyncio.Future]] = []
+        self._priority = Priority.BULK
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # references to the sending tasks, so they aren't garbage-collected before they are done
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, method: str, params: dict, priority: Priority = Priority.NORMAL) -> asyncio.Future:
+        """
+        Adds the call to the nearest batch
+
+        Args:
+            method: method of VK_API
+            params: params of the method
+            priority: lane of the call, the batch is sent in the highest lane of its calls
+
+        Returns:
+            future with the response of the method
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((method, params, future))
+        self._priority = min(self._priority, priority)
+        if len(self._pending) >= self.max_calls:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        priority, self._priority = self._priority, Priority.BULK
+        while self._pending:
+            calls, self._pending = self._pending[:self.max_calls], self._pending[self.max_calls:]
+            task = asyncio.create_task(self._send(calls, priority))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, calls: list[tuple[str, dict, asyncio.Future]], priority: Priority = Priority.NORMAL):
+        try:
+            if len(calls) == 1:
+                method, params, _ = calls[0]
+                resp = await self.session.request(method, params, priority)
+            else:
+                resp = await self.session.request('execute', {'code': to_vkscript(calls)}, priority)
+            if 'error' in resp:
+                raise VKAPIError.from_response(resp['error'], calls[0][1] if len(calls) == 1 else None)
+        except Exception as e:
+            for *_, future in calls:
+                _set_exception(future, e)
+            return
+        if len(calls) == 1:
+            _set_result(calls[0][2], resp['response'])
+            return
+        errors = collections.deque(resp.get('execute_errors', ()))
+        for (method, params, future), result in zip(calls, resp['response']):
+            if result is False and errors and errors[0]['method'] == method:
+                _set_exception(future, VKAPIError.from_response(errors.popleft(), params))
+            else:
+                _set_result(future, result)
+
+
+class BatchLoader:
+    """
+    Coalesces loads of objects by their keys into batched requests
+
+    Keys, that were requested within `max_delay` seconds, are loaded together in chunks of `max_batch_size`,
+    concurrent loads of the same key share one request
+    """
+
+    def __init__(self,
+                 load: Callable[[list], Awaitable[dict]],
+                 max_batch_size: int = 100,
+                 max_delay: float = 0.):
+        """
+        Args:
+            load: coroutine function, that accepts list of keys and returns dict of loaded objects by their keys
+            max_batch_size: maximum number of keys in one call of `load`
+            max_delay: seconds to wait for other keys before calling `load`
+        """
+        self._load = load
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[Hashable] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def _future(self, key: Hashable) -> asyncio.Future:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            self._futures[key] = future = loop.create_future()
+            self._queue.append(key)
+            if len(self._queue) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.max_delay, self._flush)
+        # shielded, so cancellation of one caller doesn't affect the others
+        return asyncio.shield(future)
+
+    async def load(self, key: Hashable):
+        """
+        Loads the object by its key
+
+        Raises:
+            KeyError: if `load` didn't return the object for the key
+        """
+        return await self._future(key)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list:
+        """
+        Loads objects by their keys
+
+        Returns:
+            objects in order of the keys
+        """
+        return await asyncio.gather(*map(self._future, keys))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._queue:
+            keys, self._queue = self._queue[:self.max_batch_size], self._queue[self.max_batch_size:]
+            task = asyncio.create_task(self._dispatch(keys))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, keys: list[Hashable]):
+        try:
+            values = await self._load(keys)
+        except Exception as e:
+            for key in keys:
+                _set_exception(self._futures.pop(key), e)
+            return
+        for key in keys:
+            future = self._futures.pop(key)
+            if key in values:
+                _set_result(future, values[key])
+            else:
+                _set_exception(future, KeyError(key))
+
+
+def to_vkscript(calls: Iterable[tuple[str, dict, Any]]) -> str:
+    """
+    Converts calls of VK_API methods to the code for `execute`, that returns the list of their results
+    """
+    return f'return [{",".join(f"API.{method}({_to_vkscript_params(params)})" for method, params, _ in calls)}];'
+
+
+def _to_vkscript_params(params: dict) -> str:
+    converted = {}
+    for key, value in params.items():
+        if isinstance(value, (list, tuple, set)):
+            value = ','.join(map(str, value))
+        elif isinstance(value, bool):
+            value = int(value)
+        converted[key] = value
+    return json.dumps(converted, ensure_ascii=False)
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exception: BaseException):
+    if not future.done():
+        future.set_exception(exception)
@@ -1,63 +1,175 @@
 import asyncio
+import collections
+import enum
+import functools
 import json
 import logging
 import os
 from abc import ABC, abstractmethod
-from typing import AsyncIterable, Dict
+from typing import AsyncIterable, Callable, Hashable
 
+import aiohttp
 from aiohttp import web
 
-from vkpybot.events import EventHandler, EventType
+from vkpybot.checkpoint import CheckpointStore
+from vkpybot.dispatch import EventDispatcher, OverflowPolicy, by_peer
+from vkpybot.events import EVENT_SCHEMAS, EventHandler, EventType, handler_parameters
 from vkpybot.sessions import GroupSession
 from vkpybot.types import Message
-from vkpybot.utils import get
+from vkpybot.utils import Backoff, get
 
 
 class EventServer(ABC):
-    def __init__(self, vk_session: GroupSession):
+    def __init__(self, vk_session: GroupSession,
+                 max_concurrency: int = 100,
+                 max_queue: int = 1000,
+                 overflow: OverflowPolicy = OverflowPolicy.BLOCK,
+                 ordering: Callable[[dict], Hashable | None] | None = by_peer,
+                 max_key_queue: int = 100):
+        """
+        Args:
+            vk_session: session of the group
+            max_concurrency: maximum number of events, that are handled simultaneously
+            max_queue: maximum number of events, that are waiting to be handled
+            overflow: what to do with new event, when the queue is full
+            ordering: function, that returns the key of the event, events with the same key are handled in order
+                (by_peer by default, by_user or None to handle all events independently)
+            max_key_queue: maximum number of waiting events with the same key
+        """
         self.vk_session = vk_session
         self.listeners: list[EventHandler] = []
-        self.tasks: list[asyncio.Task] = []
-
-    def create_task(self, coroutine):
-        self.tasks.append(task := asyncio.create_task(coroutine))
-        return task
+        # handlers of the listeners by types of events, events of other types are skipped without parsing
+        self.subscriptions: dict[EventType, list[Callable]] = {}
+        # handlers of listeners with their own __call__, they get every event with the whole context
+        self._whole_context: set[Callable] = set()
+        # numbers of events, that were passed to the listeners or skipped, by their types
+        # (events, that were dropped because of overflow, are counted by the dispatcher)
+        self.dispatched: collections.Counter[str] = collections.Counter()
+        self.skipped: collections.Counter[str] = collections.Counter()
+        self.dispatcher = EventDispatcher(self._notify_listeners,
+                                          max_concurrency=max_concurrency,
+                                          max_queue=max_queue,
+                                          overflow=overflow,
+                                          ordering=ordering,
+                                          max_key_queue=max_key_queue)
 
     def bind_listener(self, listener: EventHandler):
+        """
+        Subscribes the listener to the events, which `on_*` handlers it overrides
+
+        Listener, that overrides `__call__`, is subscribed to all events and called as
+        `listener(event_type, **context)` with the whole context (all users and messages are looked up)
+        """
         self.listeners.append(listener)
+        if type(listener).__call__ is not EventHandler.__call__:
+            for event in EventType:
+                handler = functools.partial(listener, event)
+                self._whole_context.add(handler)
+                self.subscriptions.setdefault(event, []).append(handler)
+            return
+        for event in listener.handled_events():
+            self.subscriptions.setdefault(event, []).append(listener.get_handler(event))
+
+    def is_subscribed(self, event_dict: dict) -> bool:
+        """
+        Checks if any listener handles the event, and counts it as skipped if none does
+        """
+        event_type = event_dict.get('type', '')
+        if EventType.__members__.get(event_type.upper()) in self.subscriptions:
+            return True
+        self.skipped[event_type] += 1
+        return False
+
+    def _count_dispatched(self, event_type: str, done: asyncio.Future):
+        if done.result():
+            self.dispatched[event_type] += 1
 
     async def _notify_listeners(self, event_dict):
-        event, context = await self.parse_event(event_dict)
-        for listener in self.listeners:
-            await listener(event, **context)
-
-    def notify_listeners(self, event_dict):
-        self.create_task(self._notify_listeners(event_dict))
-
-    async def parse_event(self, event) -> tuple[EventType, dict]:
-        event_type: EventType = EventType[event['type'].upper()]
-        context = {}
-        match event_type:
-            case EventType.MESSAGE_NEW:
-                message_dict = event['object']['message']
-                _wait_user = asyncio.create_task(self.vk_session.get_user(message_dict['from_id']))
-                _wait_chat = asyncio.create_task(self.vk_session.get_chat(message_dict['peer_id']))
-                message_dict['sender'], message_dict['chat'] = await asyncio.gather(_wait_user, _wait_chat)
-                context |= {'message': Message(message_dict, session=self.vk_session),
-                            'client_info': event['object']['client_info']}
-            case EventType.MESSAGE_TYPING_STATE:
-                context['state'] = event['object']['state']
-                context['sender'] = await self.vk_session.get_user(event['object']['from_id'])
+        parsed = await self.parse_event(event_dict)
+        if parsed is None:
+            return
+        event, context = parsed
+        lookups: dict[str, asyncio.Task] = {}
+        for handler in self.subscriptions.get(event, ()):
+            await handler(**await self._handler_context(handler, context, lookups, handler in self._whole_context))
+
+    async def notify_listeners(self, event_dict) -> asyncio.Future:
+        """
+        Queues the event to be handled by listeners, events, that no listener handles, are skipped at once
+
+        Returns:
+            future, that is resolved with True when the event is handled
+            or with False if it is dropped or skipped
+        """
+        if not self.is_subscribed(event_dict):
+            skipped = asyncio.get_running_loop().create_future()
+            skipped.set_result(False)
+            return skipped
+        done = await self.dispatcher.put(event_dict)
+        # counted when the event is passed to the listeners, not when it is queued, because it can be dropped later
+        done.add_done_callback(functools.partial(self._count_dispatched, event_dict['type']))
+        return done
+
+    async def parse_event(self, event) -> tuple[EventType, dict] | None:
+        """
+        Builds the context of the event by its schema (see events.EVENT_SCHEMAS)
+
+        Fields, that require requests to VK_API (users, messages), are returned as coroutine functions,
+        they are called only for handlers, that need these fields
+
+        Returns:
+            type of the event and its context or None if the type of event is unknown
+        """
+        try:
+            event_type: EventType = EventType[event['type'].upper()]
+        except KeyError:
+            logging.warning(f'Skipping event of unknown type {event["type"]!r}')
+            return None
+        schema = EVENT_SCHEMAS[event_type]
+        obj = event['object']
+        context = schema.unpack(obj)
+        for field, key in schema.users.items():
+            if obj.get(key) is not None:
+                context[field] = functools.partial(self.vk_session.get_user, obj[key])
+        if schema.message is not None:
+            context['message'] = functools.partial(self._build_message, obj[schema.message] if schema.message else obj)
         return event_type, context
 
+    async def _build_message(self, message_dict: dict) -> Message:
+        message_dict['sender'], message_dict['chat'] = await asyncio.gather(
+            self.vk_session.get_user(message_dict['from_id']),
+            self.vk_session.get_chat(message_dict['peer_id']))
+        return Message(message_dict, session=self.vk_session)
+
+    @staticmethod
+    async def _handler_context(handler: Callable,
+                               context: dict,
+                               lookups: dict[str, asyncio.Task],
+                               whole: bool = False) -> dict:
+        # only fields, that are named in the signature, are looked up, and lookups are shared by handlers
+        names, any_keywords = (frozenset(context), True) if whole else handler_parameters(handler)
+        result = {}
+        for field, value in context.items():
+            if isinstance(value, functools.partial):
+                if field in names:
+                    if field not in lookups:
+                        lookups[field] = asyncio.ensure_future(value())
+                    result[field] = lookups[field]
+            elif any_keywords or field in names:
+                result[field] = value
+        for field, value in result.items():
+            if isinstance(value, asyncio.Future):
+                result[field] = await value
+        return result
+
     @abstractmethod
     def listen(self):
         pass
 
 
 class CallBackServer(EventServer):
-    def __init__(self, vk_session: GroupSession, host='localhost', port=8080):
-        super().__init__(vk_session)
+    def __init__(self, vk_session: GroupSession, host='localhost', port=8080, **kwargs):
+        super().__init__(vk_session, **kwargs)
         self.host = host
         self.port = port
         self.app = web.Application()
@@ -68,19 +180,23 @@ class CallBackServer(EventServer):
             if req['type'] == 'confirmation':
                 return web.Response(text=os.environ['CODE'])
             else:
-                self.notify_listeners(req)
+                await self.notify_listeners(req)
                 return web.Response(text='ok')
 
+        async def close_session(app: web.Application):
+            await self.dispatcher.close()
+            await self.vk_session.close()
+
         self.app.add_routes([web.post('/', hello_post)])
+        self.app.on_cleanup.append(close_session)
 
     def listen(self):
         web.run_app(self.app, host=self.host, port=self.port)
-        asyncio.run(asyncio.gather(*self.tasks))
 
 
 class YandexCloudFunction(EventServer):
-    def __init__(self, vk_session: GroupSession):
-        super().__init__(vk_session)
+    def __init__(self, vk_session: GroupSession, **kwargs):
+        super().__init__(vk_session, **kwargs)
 
         async def hello_post(event: dict, context: dict):
 
@@ -92,7 +208,9 @@ class YandexCloudFunction(EventServer):
                         'body': os.environ['CODE']
                         }
             else:
-                await self._notify_listeners(event)
+                if self.is_subscribed(event):
+                    await self._notify_listeners(event)
+                    self.dispatched[event['type']] += 1
                 return {'statusCode': 200,
                         'body': 'ok'
                         }
@@ -103,63 +221,173 @@ class YandexCloudFunction(EventServer):
         pass
 
 
+class CircuitState(enum.Enum):
+    """
+    State of the connection to the long_poll_server
+    """
+    # requests succeed
+    CLOSED = enum.auto()
+    # last request failed, waiting before the retry
+    OPEN = enum.auto()
+    # retrying after failure
+    HALF_OPEN = enum.auto()
+
+
 class LongPollServer(EventServer):
-    def __init__(self, vk_session: GroupSession, server: str, key: str, ts: int):
-        super().__init__(vk_session)
+    def __init__(self, vk_session: GroupSession, server: str, key: str, ts: int,
+                 wait: int = 25,
+                 backoff: Backoff | None = None,
+                 refresh_after: int = 5,
+                 checkpoint: CheckpointStore | None = None,
+                 **kwargs):
+        """
+        Args:
+            vk_session: session of the group
+            server: url of long_poll_server
+            key: secret key of the long poll session
+            ts: number of the last received event
+            wait: seconds, that long_poll_server waits for new events before empty response (up to 90)
+            backoff: delays between retries of failed requests
+            refresh_after: number of failed requests in a row, after which long_poll_server information is updated
+            checkpoint: store of ts of the last handled events, if it has saved ts, listening is resumed from it
+            **kwargs: dispatching settings (see EventServer)
+        """
+        super().__init__(vk_session, **kwargs)
         self.server = server
         self.key = key
         self.ts = ts
+        self.wait = wait
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.refresh_after = refresh_after
+        self.circuit_state = CircuitState.CLOSED
+        self.failures: int = 0
+        self.last_error: Exception | None = None
+        self.checkpoint = checkpoint
+        if checkpoint is not None and (saved_ts := checkpoint.load()) is not None:
+            logging.info(f'Resuming from ts {saved_ts}')
+            self.ts = saved_ts
 
-    async def check(self) -> AsyncIterable[tuple[EventType, Dict]]:
+    async def a_check(self) -> list[dict]:
         """
-        Checks for new events on long_poll_server, updates long_poll_server information if failed to get events
+        Requests new events from long_poll_server, updates long_poll_server information if failed to get events
 
-        Yields:
-            tuple
-                event and context dictionary
+        Failed requests are retried with exponential backoff, long_poll_server information is refreshed after
+        `refresh_after` failures in a row
+
+        Returns:
+            raw events from VK_API (empty if failed to get events)
         """
         result = None
-        retries = 0
         while result is None:
+            if self.failures:
+                self.circuit_state = CircuitState.HALF_OPEN
             try:
                 params = {'act': 'a_check',
                           'key': self.key,
                           'ts': self.ts,
-                          'wait': 25}
-                result = await get(self.server, params)
-            except Exception:
-                logging.exception(f'try {(retries := retries + 1)}')
+                          'wait': self.wait}
+                result = await get(self.server, params, self.vk_session.http,
+                                   timeout=aiohttp.ClientTimeout(total=self.wait + 10))
+            except Exception as e:
+                await self._on_failure(e)
+        self.failures = 0
+        self.last_error = None
+        self.circuit_state = CircuitState.CLOSED
 
         if 'failed' in result:
             error_code = result['failed']
             if error_code == 1:
                 logging.debug('Updating ts')
                 self.ts = result['ts']
-            elif error_code in (2, 3):
-                logging.info('Updating long_poll_server')
+            elif error_code == 2:
+                logging.info('Updating key of long_poll_server')
                 await self.__update()
+            elif error_code == 3:
+                logging.info('Updating long_poll_server')
+                await self.__update(reset_ts=True)
             else:
                 logging.error(f'Unexpected error_code code: {error_code} in {result}')
-        else:
-            self.ts = result['ts']
-            events = result['updates']
-            for event in events:
-                yield event
+            return []
+        self.ts = result['ts']
+        return result['updates']
+
+    async def _on_failure(self, error: Exception):
+        self.failures += 1
+        self.last_error = error
+        self.circuit_state = CircuitState.OPEN
+        match error:
+            case asyncio.TimeoutError():
+                logging.warning(f'long_poll_server timed out (try {self.failures})')
+                # single timeout is usual for long polling, so it's retried immediately
+                delay = self.backoff.delay(self.failures - 2) if self.failures > 1 else 0
+            case aiohttp.ClientResponseError(status=status) if status >= 500:
+                logging.warning(f'long_poll_server responded with {status} (try {self.failures})')
+                delay = self.backoff.delay(self.failures - 1)
+            case aiohttp.ClientConnectionError():
+                logging.warning(f'Connection to long_poll_server failed: {error!r} (try {self.failures})')
+                delay = self.backoff.delay(self.failures - 1)
+            case _:
+                logging.exception(f'try {self.failures}')
+                delay = self.backoff.delay(self.failures - 1)
+        await asyncio.sleep(delay)
+        if self.failures % self.refresh_after == 0:
+            logging.info('Updating long_poll_server after repeated failures')
+            try:
+                await self.__update()
+            except Exception:
+                logging.exception('Failed to update long_poll_server')
+
+    async def check(self) -> AsyncIterable[dict]:
+        """
+        Checks for new events on long_poll_server
+
+        Yields:
+            raw events from VK_API
+        """
+        for event in await self.a_check():
+            yield event
 
     def listen(self) -> None:
-        asyncio.run(self._listen())
+        async def run():
+            async with self.vk_session:
+                try:
+                    await self._listen()
+                finally:
+                    if self.checkpoint is not None:
+                        self.checkpoint.close()
+
+        asyncio.run(run())
 
     async def _listen(self) -> None:
+        pending = asyncio.create_task(self.a_check())
+        acknowledged = None
         try:
             while True:
-                async for event in self.check():
-                    self.notify_listeners(event)
+                events = await pending
+                ts = self.ts
+                # the next request is already waiting for events, while the current ones are being dispatched
+                pending = asyncio.create_task(self.a_check())
+                await asyncio.sleep(0)
+                handled = [await self.notify_listeners(event) for event in events]
+                if self.checkpoint is not None:
+                    acknowledged = asyncio.create_task(self._acknowledge(acknowledged, handled, ts))
         except Exception as e:
             logging.exception(e)
-            await asyncio.gather(*self.tasks)
+            pending.cancel()
+            await self.dispatcher.close()
+            if acknowledged is not None:
+                await acknowledged
+
+    async def _acknowledge(self, previous: asyncio.Task | None, handled: list[asyncio.Future], ts: str):
+        # batches are acknowledged in order, so the checkpoint never skips unhandled events
+        if previous is not None:
+            await previous
+        await asyncio.gather(*handled)
+        self.checkpoint.save(ts)
 
-    async def __update(self):
+    async def __update(self, reset_ts: bool = False):
         new = await self.vk_session.get_long_poll_server_row()
         self.server = new['server']
         self.key = new['key']
-        self.ts = new['ts']
+        if reset_ts:
+            self.ts = new['ts']
@@ -1,15 +1,24 @@
 import asyncio
+import collections
+import inspect
 import json
+import logging
+import os
 import typing
 from functools import lru_cache
 from random import randint
-from typing import Optional, Sequence
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional, Sequence
 
 import aiohttp
 import requests
 
+from vkpybot.broadcast import BroadcastState, broadcast
+from vkpybot.cache import Cache, LRUCache
+from vkpybot.errors import AuthorizationError, CaptchaNeededError, VKAPIError, is_transient
+from vkpybot.outbox import Outbox
+from vkpybot.scheduler import BatchLoader, ExecuteBatcher, Priority, RateLimiter
 from vkpybot.types import Chat, User, Conversation, PrivateChat, Message
-from vkpybot.utils import get
+from vkpybot.utils import Backoff, file_digest, get, post
 
 if typing.TYPE_CHECKING:
     from vkpybot.servers import LongPollServer
@@ -21,38 +30,248 @@ class Session:
     """
     __base_url = 'https://api.vk.com/method/'
 
-    def __init__(self, access_token: str, api_version: float = 5.126):
+    def __init__(self, access_token: str, api_version: float = 5.126, *,
+                 connections_limit: int = 100,
+                 connections_per_host: int = 0,
+                 dns_cache_ttl: int | None = 300,
+                 keepalive_timeout: float = 30,
+                 requests_per_second: float | None = 3,
+                 max_queue: int | None = None,
+                 max_wait: float | None = None,
+                 batch_window: float | None = None,
+                 lookup_delay: float = 0.,
+                 users_cache: Cache | None = None,
+                 chats_cache: Cache | None = None,
+                 image_cache: Cache | None = None,
+                 document_cache: Cache | None = None,
+                 outbox_window: float | None = None,
+                 retries: int = 3,
+                 retry_backoff: Backoff | None = None,
+                 captcha_handler: Callable[[CaptchaNeededError], str | Awaitable[str]] | None = None,
+                 on_token_invalid: Callable[[AuthorizationError], str | None | Awaitable[str | None]] | None = None):
         """
         Args:
             access_token:
                 USER_API_TOKEN for VK_API
             api_version:
                 version af VK_API that you use
+            connections_limit:
+                maximum number of simultaneously opened connections (0 for unlimited)
+            connections_per_host:
+                maximum number of simultaneously opened connections to one host (0 for unlimited)
+            dns_cache_ttl:
+                seconds to cache resolved addresses (None to cache forever)
+            keepalive_timeout:
+                seconds to keep idle connections opened
+            requests_per_second:
+                maximum rate of requests to VK_API (None to disable pacing)
+            max_queue:
+                maximum number of requests, that can wait for their turn
+            max_wait:
+                maximum seconds, that request can wait for its turn (QueueTimeoutError is raised, it isn't retried)
+            batch_window:
+                if passed, calls made within this number of seconds are packed into single `execute` request
+            lookup_delay:
+                seconds to wait for other lookups of users or chats before requesting them together
+            users_cache:
+                cache of users by their ids (LRUCache for 10000 users for an hour by default)
+            chats_cache:
+                cache of chats by their ids (LRUCache for 1000 chats for 10 minutes by default)
+            image_cache:
+                cache of uploaded images by their content (LRUCache for 1000 images by default,
+                use SQLiteCache to keep uploads after restart)
+            document_cache:
+                cache of uploaded documents by their content and chat (LRUCache for 1000 documents by default)
+            outbox_window:
+                if passed, messages sent within this number of seconds are merged and (only for groups)
+                sent to several chats at once (see Outbox)
+            retries:
+                number of retries of requests, that failed with transient errors (network errors, VK_API errors 6, 9, 10)
+            retry_backoff:
+                delays between retries (the same delays are used for "Too many requests per second" error)
+            captcha_handler:
+                function, that returns the key of the captcha (see CaptchaNeededError), if passed,
+                requests, that require the captcha, are repeated with its key
+            on_token_invalid:
+                function, that is called when access_token becomes invalid, if it returns new token,
+                requests are repeated with it, otherwise all further requests raise AuthorizationError
         """
         self.session_params: dict = {'access_token': access_token,
                                      'v': api_version}
+        self._connector_params = {'limit': connections_limit,
+                                  'limit_per_host': connections_per_host,
+                                  'ttl_dns_cache': dns_cache_ttl,
+                                  'keepalive_timeout': keepalive_timeout}
+        self._http: aiohttp.ClientSession | None = None
+        self._http_loop: asyncio.AbstractEventLoop | None = None
+        self.limiter: RateLimiter | None = None
+        if requests_per_second:
+            self.limiter = RateLimiter(requests_per_second, max_queue=max_queue, max_wait=max_wait)
+        self.batcher: ExecuteBatcher | None = None
+        if batch_window is not None:
+            self.batcher = ExecuteBatcher(self, batch_window)
+        self._users_cache = users_cache if users_cache is not None else LRUCache(10000, ttl=3600)
+        self._chats_cache = chats_cache if chats_cache is not None else LRUCache(1000, ttl=600)
+        self._image_cache = image_cache if image_cache is not None else LRUCache(1000)
+        self._document_cache = document_cache if document_cache is not None else LRUCache(1000)
+        self._uploads: dict[str, asyncio.Future] = {}
+        self._users_loader = BatchLoader(self._load_users, max_batch_size=1000, max_delay=lookup_delay)
+        self._chats_loader = BatchLoader(self._load_chats, max_batch_size=100, max_delay=lookup_delay)
+        self.outbox: Outbox | None = None
+        if outbox_window is not None:
+            # VK_API allows to send message to several chats only for groups
+            self.outbox = Outbox(self, outbox_window, group_peers=isinstance(self, GroupSession))
+        self.retries = retries
+        self.retry_backoff = retry_backoff if retry_backoff is not None else Backoff()
+        # retries of requests and requests, that failed after all retries, by methods
+        self.retried: collections.Counter[str] = collections.Counter()
+        self.retries_exhausted: collections.Counter[str] = collections.Counter()
+        self.captcha_handler = captcha_handler
+        self.on_token_invalid = on_token_invalid
+        # error, that made the access_token invalid
+        self.token_error: AuthorizationError | None = None
+        self._token_refresh: tuple[str, asyncio.Future] | None = None
 
-    async def method(self, method: str, params: dict = None) -> dict:
+    @property
+    def http(self) -> aiohttp.ClientSession:
+        """
+        Pooled HTTP-client, that is shared by all requests of the session
+
+        It is created lazily for the running event loop and recreated if the loop has changed
+        """
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.closed or self._http_loop is not loop:
+            self._http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**self._connector_params))
+            self._http_loop = loop
+        return self._http
+
+    async def close(self):
+        """
+        Closes all connections of the session
+        """
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+        self._http_loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def method(self,
+                     method: str,
+                     params: dict = None,
+                     priority: Priority = Priority.NORMAL,
+                     retries: int | None = None) -> dict:
         """
         Base method for accessing VK_API (asynchronous)
 
+        Requests, that failed with transient errors, are retried with the same params,
+        so `messages.send` keeps its random_id and VK_API doesn't send the message twice
+
         Args:
             method:
                 method of VK_API
             params:
                 params of request to VK_API
+            priority:
+                lane of the request in the rate limiter (replies to users should be INTERACTIVE,
+                background work should be BULK)
+            retries:
+                number of retries of transient errors (session's `retries` by default)
         Returns:
             JSON-response from VK_API
+        Raises:
+            VKAPIError: if VK_API returned an error (subclass of VKAPIError for known error codes)
         """
         if params is None:
             params = {}
-        # logging.debug(f'(request){self.__base_url}{method}, {params | self.session_params | {"access_token": ""} }')
-        resp = (await get(f'{self.__base_url}{method}', params | self.session_params))
-        # logging.debug(f'(response){resp}')
+        if retries is None:
+            retries = self.retries
+        attempt = 0
+        while True:
+            if self.token_error is not None:
+                raise self.token_error
+            try:
+                return await self._method(method, params, priority)
+            except AuthorizationError as e:
+                if attempt >= retries:
+                    raise
+                await self._on_authorization_error(e)
+                attempt += 1
+                continue
+            except CaptchaNeededError as e:
+                if self.captcha_handler is None or attempt >= retries:
+                    raise
+                captcha_key = self.captcha_handler(e)
+                if inspect.isawaitable(captcha_key):
+                    captcha_key = await captcha_key
+                params = params | {'captcha_sid': e.captcha_sid, 'captcha_key': captcha_key}
+                attempt += 1
+                continue
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                if attempt >= retries:
+                    self.retries_exhausted[method] += 1
+                    raise
+                delay = self.retry_backoff.delay(attempt)
+                logging.warning(f'{method} failed with {e!r}, retrying in {delay:.2f}s')
+                self.retried[method] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _method(self, method: str, params: dict, priority: Priority) -> dict:
+        if self.batcher is not None and method != 'execute':
+            return await self.batcher.submit(method, params, priority)
+        resp = await self.request(method, params, priority)
         if 'error' in resp:
-            raise Exception(f"code {resp['error']['error_code']}: {resp['error']['error_msg']}")
+            raise VKAPIError.from_response(resp['error'], params)
         return resp['response']
 
+    async def _on_authorization_error(self, error: AuthorizationError):
+        token = self.session_params['access_token']
+        # concurrent requests with the same token share one refresh
+        if self._token_refresh is None or self._token_refresh[0] != token:
+            self._token_refresh = (token, asyncio.ensure_future(self._refresh_token(error)))
+        await asyncio.shield(self._token_refresh[1])
+
+    async def _refresh_token(self, error: AuthorizationError):
+        new_token = None
+        if self.on_token_invalid is not None:
+            new_token = self.on_token_invalid(error)
+            if inspect.isawaitable(new_token):
+                new_token = await new_token
+        if new_token:
+            logging.info('Access token has been replaced')
+            self.session_params['access_token'] = new_token
+        else:
+            logging.error(f'Access token is invalid: {error}')
+            self.token_error = error
+
+    async def request(self, method: str, params: dict, priority: Priority = Priority.NORMAL) -> dict:
+        """
+        Sends single request to VK_API without checking it for errors
+
+        Args:
+            method: method of VK_API
+            params: params of request to VK_API
+            priority: lane of the request in the rate limiter
+
+        Returns:
+            whole JSON-object, returned by VK_API
+        """
+        if self.limiter is not None:
+            await self.limiter.acquire(priority)
+        url = f'{self.__base_url}{method}'
+        # logging.debug(f'(request){url}, {params | self.session_params | {"access_token": ""} }')
+        if method == 'execute':
+            # code of the batch can exceed the length of url
+            return await post(url, params | self.session_params, self.http)
+        return await get(url, params | self.session_params, self.http)
+
     def method_sync(self, method: str, params: Optional[dict] = None) -> dict:
         """
         Base method for accessing VK_API (synchronous)
@@ -67,106 +286,178 @@ class Session:
         if params is None:
             params = dict()
         url = f'{self.__base_url}{method}'
-        params |= self.session_params
-        resp = requests.get(url, params).json()
+        resp = requests.get(url, params | self.session_params).json()
         if 'error' in resp:
-            raise Exception(f"code {resp['error']['error_code']}: {resp['error']['error_msg']}")
+            raise VKAPIError.from_response(resp['error'], params)
         return resp['response']
 
     @property
     def cache(self):
         response = f'Пользователи: {",".join(map(lambda user: user.refer, self._users_cache.values()))}\n'
         response += f'Чаты: {[*self._chats_cache.values()]}\n'
-        response += f'Изображения: {[*self._image_cache.values()]}'
+        response += f'Изображения: {[*self._image_cache.values()]}\n'
+        response += f'Статистика пользователей: {self._users_cache.stats}\n'
+        response += f'Статистика чатов: {self._chats_cache.stats}\n'
+        response += f'Статистика изображений: {self._image_cache.stats}\n'
+        response += f'Статистика документов: {self._document_cache.stats}'
         return response
 
-    _image_cache = {}
-
     async def upload_image(self, image: str) -> str:
         """
         Uploads the image to the hidden album, saves it and returns the attachment-sting of the image
+
+        Images are cached by their content, so the same image is uploaded only once
         Args:
             image (str): path to the image
         Returns:
              image as the attachment
         """
-        file = {'photo': open(image, 'rb')}
-        if file['photo'] not in Session._image_cache:
-            params = {
-                'peer_id': 0
-            }
-            upload_url = (await self.method(method=f'photos.getMessagesUploadServer',
-                                            params=params))['upload_url']
-            async with aiohttp.ClientSession() as session:
-                resp = await session.post(url=upload_url, data=file)
-                photo: dict = json.loads(await resp.text())
-            response = (await self.method(method='photos.saveMessagesPhoto', params=photo))[0]
-            Session._image_cache[file['photo']] = f'photo{response["owner_id"]}_{response["id"]}'
-        return Session._image_cache[file['photo']]
+        return await self._cached_upload(self._image_cache, await file_digest(image), self._upload_image, image)
+
+    async def _upload_image(self, image: str) -> str:
+        photo = await self._post_file(await self._get_image_upload_url(), 'photo', image)
+        response = (await self.method(method='photos.saveMessagesPhoto', params=photo))[0]
+        return f'photo{response["owner_id"]}_{response["id"]}'
+
+    async def upload_images(self,
+                            images: Iterable[str],
+                            concurrency: int = 4,
+                            priority: Priority = Priority.NORMAL) -> AsyncIterator[tuple[str, str]]:
+        """
+        Uploads many images with bounded parallelism
+
+        One upload server is used for all images, files are streamed from the disk, and saving of the uploaded
+        images is packed into `execute` requests. Images are cached by their content as in `upload_image`
+
+        Args:
+            images: paths to the images
+            concurrency: maximum number of simultaneously uploaded files
+            priority: lane of the requests to VK_API
+
+        Yields:
+            pairs of the path and the attachment-string of the image in order of completion
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        saver = self.batcher if self.batcher is not None else ExecuteBatcher(self)
+        upload_url: asyncio.Future | None = None
+
+        async def upload(image: str) -> str:
+            nonlocal upload_url
+            if upload_url is None:
+                upload_url = asyncio.ensure_future(self._get_image_upload_url(priority))
+            async with semaphore:
+                photo = await self._post_file(await asyncio.shield(upload_url), 'photo', image)
+            response = (await saver.submit('photos.saveMessagesPhoto', photo, priority))[0]
+            return f'photo{response["owner_id"]}_{response["id"]}'
+
+        async def cached_upload(image: str) -> tuple[str, str]:
+            return image, await self._cached_upload(self._image_cache, await file_digest(image), upload, image)
+
+        tasks = [asyncio.ensure_future(cached_upload(image)) for image in images]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _get_image_upload_url(self, priority: Priority = Priority.NORMAL) -> str:
+        return (await self.method('photos.getMessagesUploadServer', {'peer_id': 0}, priority))['upload_url']
+
+    async def _post_file(self, url: str, field: str, path: str) -> dict:
+        # aiohttp reads the file by chunks in the thread pool, so only opening is left to be moved out of the loop
+        file = await asyncio.to_thread(open, path, 'rb')
+        try:
+            async with self.http.post(url=url, data={field: file}) as resp:
+                return json.loads(await resp.text())
+        finally:
+            file.close()
 
     async def upload_document(self, doc: str, chat: 'Chat') -> str:
         """
-        Uploads the image to the hidden album, saves it and returns the attachment-sting of the image
+        Uploads the document, saves it and returns the attachment-sting of the document
+
+        Documents are cached by their content and chat, so the same document is uploaded only once for every chat
         Args:
             chat: chat where document will be sent
             doc (str): path to the document
         Returns:
              document as the attachment
         """
+        key = f'{await file_digest(doc)}:{chat.id}'
+        return await self._cached_upload(self._document_cache, key, self._upload_document, doc, chat)
+
+    async def _upload_document(self, doc: str, chat: 'Chat') -> str:
         params = {
             'peer_id': chat.id
         }
-        file = {'file': open(doc, mode='rb')}
         upload_url = (await self.method(method='docs.getMessagesUploadServer',
                                         params=params))
-        upload_url = upload_url['upload_url']
-        async with aiohttp.ClientSession() as session:
-            resp = await session.post(url=upload_url, data=file)
-            document: dict = json.loads(await resp.text())
+        document = await self._post_file(upload_url['upload_url'], 'file', doc)
         response = (await self.method(method='docs.save',
-                                      params=document | {'title': file['file'].name.split('\\')[-1]}))
-        result = f'{response["type"]}{response["doc"]["owner_id"]}_{response["doc"]["id"]}'
-        return result
-
-    class GetUsersRequest:
-        def __init__(self, users: Sequence[int], session: 'Session'):
-            self.user_ids = users
-            self.session = session
-
-        def add_request(self, users: Sequence[int]):
-            self.user_ids += users
+                                      params=document | {'title': os.path.basename(doc)}))
+        return f'{response["type"]}{response["doc"]["owner_id"]}_{response["doc"]["id"]}'
+
+    async def _cached_upload(self, cache: Cache, key: str, upload: Callable[..., Awaitable[str]], *args) -> str:
+        if (attachment := cache.get(key)) is not None:
+            return attachment
+        # concurrent uploads of the same file share one upload
+        if key not in self._uploads:
+            async def upload_and_cache() -> str:
+                # the result is cached before the upload is removed from the shared ones,
+                # so there is no moment, when the file is neither cached nor being uploaded
+                cache[key] = attachment = await upload(*args)
+                return attachment
+
+            self._uploads[key] = asyncio.ensure_future(upload_and_cache())
+            self._uploads[key].add_done_callback(lambda _: self._uploads.pop(key, None))
+        return await asyncio.shield(self._uploads[key])
+
+    async def _load_users(self, user_ids: list[int]) -> dict[int, 'User']:
+        users = {}
+        for user in await self.method('users.get', {'user_ids': ','.join(map(str, user_ids))}):
+            user = User(user, session=self)
+            self._users_cache[user.id] = users[user.id] = user
+        return users
 
-        async def __call__(self):
-            await asyncio.sleep(.3)
-            return await self.session.method('users.get', {'user_ids': ','.join(map(str, self.user_ids))})
+    async def get_users(self, users: Sequence[int]) -> list['User']:
+        """
+        Returns users by their ids, missing users are requested from VK_API in batches
 
-    _users_cache = {}
-    _get_user_request: GetUsersRequest = None
-    _get_user_request_task: asyncio.Task = None
+        Args:
+            users: ids of users
 
-    async def get_users(self, users: Sequence[int]) -> list['User']:
-        if len(not_cached := [*filter(lambda x: x not in Session._users_cache, users)]) > 0:
-            if Session._get_user_request_task is None:
-                Session._get_user_request = Session.GetUsersRequest(not_cached, self)
-                Session._get_user_request_task = asyncio.create_task(Session._get_user_request())
-                _users = await Session._get_user_request_task
-                for user in _users:
-                    user = User(user, session=self)
-                    Session._users_cache[user.id] = user
-                Session._get_user_request_task = None
-            else:
-                Session._get_user_request.add_request(not_cached)
-                await Session._get_user_request_task
-        result = [*{Session._users_cache[user] for user in users}]
-        return result
+        Returns:
+            users in order of ids (without duplicates)
+        """
+        result = {user: self._users_cache.get(user) for user in users}
+        if not_cached := [user for user, cached in result.items() if cached is None]:
+            result |= zip(not_cached, await self._users_loader.load_many(not_cached))
+        return [*result.values()]
 
     async def get_user(self, user: int) -> 'User':
         return (await self.get_users([user]))[0]
 
-    _chats_cache = {}
+    async def _load_chat(self, chat_dict: dict) -> 'Chat':
+        if chat_dict['peer']['type'] == 'chat':
+            chat_dict['admins'] = await self.get_users(
+                [*filter(lambda x: x > 0, [chat_dict['chat_settings']['owner_id'],
+                                           *chat_dict['chat_settings']['admin_ids']])])
+            chat_cls = Conversation
+        else:
+            chat_cls = PrivateChat
+        chat = chat_cls(chat_dict, session=self)
+        self._chats_cache[chat.id] = chat
+        return chat
+
+    async def _load_chats(self, chat_ids: list[int]) -> dict[int, 'Chat']:
+        result = await self.method('messages.getConversationsById', {'peer_ids': ','.join(map(str, chat_ids))})
+        chats = await asyncio.gather(*map(self._load_chat, result['items']))
+        return {chat.id: chat for chat in chats}
 
     async def get_chat(self, chat_id: int) -> 'Chat':
         """
+        Returns chat by its id, concurrent lookups of missing chats share requests to VK_API
 
         Args:
             chat_id: id of chat for this API-token
@@ -174,18 +465,9 @@ class Session:
         Returns:
 
         """
-        if chat_id not in Session._chats_cache:
-            result = await self.method('messages.getConversationsById', {'peer_ids': chat_id})
-            chat_dict = result['items'][0]
-            if chat_dict['peer']['type'] == 'chat':
-                chat_dict['admins'] = await self.get_users(
-                    [*filter(lambda x: x > 0, [chat_dict['chat_settings']['owner_id'],
-                                               *chat_dict['chat_settings']['admin_ids']])])
-                chat_cls = Conversation
-            else:
-                chat_cls = PrivateChat
-            Session._chats_cache[chat_id] = chat_cls(chat_dict, session=self)
-        return Session._chats_cache[chat_id]
+        if (chat := self._chats_cache.get(chat_id)) is None:
+            chat = await self._chats_loader.load(chat_id)
+        return chat
 
     def execute(self, code: str, func_v: int = 1):
         return self.method('execute', {'code': code, 'func_v': func_v})
@@ -223,7 +505,8 @@ return {{"message":messages.items[0],
                      text: str = '',
                      attachments: list = None,
                      forward_message: dict = None,
-                     sticker: int | None = None):
+                     sticker: int | None = None,
+                     priority: Priority = Priority.NORMAL):
         """
             Args:
                 chat: Chat
@@ -237,6 +520,7 @@ return {{"message":messages.items[0],
                         'conversation_message_ids': list[int],
                         Optional['is_reply']: 1 if replying (only if forwarding to one message in same chat)
                     }
+                priority: lane of the request in the rate limiter
 
             Returns:
                 dict:
@@ -261,7 +545,54 @@ return {{"message":messages.items[0],
             params['attachment'] = attachments
         if forward_message is not None:
             params['forward'] = json.dumps(forward_message)
-        return self.method(method, params)
+        if self.outbox is not None:
+            del params['peer_id'], params['random_id']
+            return self.outbox.send(chat.id, params, priority)
+        return self.method(method, params, priority)
+
+    def broadcast(self,
+                  peers: Iterable[int],
+                  text: str = '',
+                  attachments: list | None = None,
+                  *,
+                  chunk_size: int = 100,
+                  concurrency: int = 1,
+                  retries: int = 3,
+                  backoff: Backoff | None = None,
+                  state: BroadcastState | None = None) -> AsyncIterator[dict]:
+        """
+        Sends the same message to many chats
+
+        Chats are sent in chunks (one request per chunk) in the BULK lane, transient errors are retried,
+        so the broadcast doesn't delay replies and other requests of the session
+
+        Args:
+            peers: ids of the chats
+            text: the text of the message
+            attachments: attachments of the message
+            chunk_size: number of chats in one request (up to 100, only for groups,
+                VK_API doesn't allow to send message to several chats with the token of user)
+            concurrency: maximum number of simultaneous requests
+            retries: number of retries of requests, that failed with transient errors
+            backoff: delays between retries
+            state: state of the broadcast to pause it, see its progress or resume it after restart
+
+        Yields:
+            delivery result for every chat:
+                {
+                    'peer_id': id of the chat,
+                    'message_id': id of the message,
+                    'conversation_message_id': id of the message in the chat,
+                    'error': error if the message wasn't delivered
+                }
+        """
+        if text == '' and not attachments:
+            raise ValueError("Can't send empty message")
+        params = {'message': text}
+        if attachments is not None:
+            params['attachment'] = attachments
+        return broadcast(self, peers, params, chunk_size=chunk_size, concurrency=concurrency,
+                         retries=retries, backoff=backoff, state=state, group_peers=isinstance(self, GroupSession))
 
     def reply(self,
               message: 'Message',
@@ -287,7 +618,8 @@ return {{"message":messages.items[0],
                                  text=text,
                                  forward_message=forward_message,
                                  attachments=attachments,
-                                 sticker=sticker)
+                                 sticker=sticker,
+                                 priority=Priority.INTERACTIVE)
 
     def forward(self,
                 messages: list['Message'],
@@ -324,14 +656,16 @@ class GroupSession(Session):
     """
 
     @lru_cache
-    def __init__(self, access_token: str, api_version: float = 5.126):
+    def __init__(self, access_token: str, api_version: float = 5.126, **kwargs):
         """
 
         Args:
             access_token: GROUP_API_TOKEN for VK_API
             api_version: version af VK_API that you use
+            **kwargs: connection pool and rate limiting settings (see Session)
         """
-        super().__init__(access_token, api_version)
+        kwargs.setdefault('requests_per_second', 20)
+        super().__init__(access_token, api_version, **kwargs)
         self.session_params |= {'group_id': self.method_sync('groups.getById')[0]['id']}
 
     async def get_long_poll_server(self):
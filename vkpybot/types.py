@@ -1,5 +1,4 @@
 import datetime
-import functools
 import typing
 
 if typing.TYPE_CHECKING:
@@ -7,6 +6,9 @@ if typing.TYPE_CHECKING:
 
 
 class VKObject:
+    # objects are slotted, because sessions keep a lot of cached users and chats
+    __slots__ = ('_session',)
+
     def __init__(self, *, session: 'Session'):
         self._session = session
 
@@ -15,6 +17,7 @@ class User(VKObject):
     """
     Represent user from VK_API
     """
+    __slots__ = ('id', 'first_name', 'last_name', 'is_closed', 'can_access_closed', '_refer')
 
     def __init__(self, usr: dict, *, session: 'Session'):
         super().__init__(session=session)
@@ -23,11 +26,13 @@ class User(VKObject):
         self.last_name: str = usr['last_name']
         self.is_closed: bool = bool(usr['is_closed'])
         self.can_access_closed: bool = bool(usr['can_access_closed'])
+        self._refer: str | None = None
 
     @property
-    @functools.lru_cache()
     def refer(self):
-        return f"[id{self.id}|{str(self)}]"
+        if self._refer is None:
+            self._refer = f"[id{self.id}|{str(self)}]"
+        return self._refer
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -46,6 +51,7 @@ class Chat(VKObject):
     """
     Represents chat from VK_API
     """
+    __slots__ = ('id',)
 
     def __init__(self, chat_dict, *, session: 'Session'):
         super().__init__(session=session)
@@ -73,6 +79,8 @@ class Chat(VKObject):
 
 
 class PrivateChat(Chat):
+    __slots__ = ()
+
     def __init__(self, chat_dict, *, session: 'Session'):
         super().__init__(chat_dict, session=session)
 
@@ -84,6 +92,8 @@ class PrivateChat(Chat):
 
 
 class Conversation(Chat):
+    __slots__ = ('title', 'owner', 'admins', 'member_count')
+
     def __init__(self, chat_dict, *, session: 'Session'):
         super().__init__(chat_dict, session=session)
         self.title = chat_dict['chat_settings']['title']
@@ -102,15 +112,52 @@ class Message(VKObject):
     """
     Representing existing message from VK_API
 
+    Rarely used fields are decoded from the raw message on the first access
     """
+    __slots__ = ('text', 'sender', 'chat', 'conversation_message_id', '_raw', '_date')
 
     def __init__(self, msg: dict, *, session: 'Session'):
         super().__init__(session=session)
-        self.date: datetime.datetime = datetime.datetime.fromtimestamp(msg['date'])
         self.text: str = msg['text']
         self.sender: User = msg['sender']
         self.chat: Chat = msg['chat']
         self.conversation_message_id: int = int(msg['conversation_message_id'])
+        self._raw = msg
+        self._date: datetime.datetime | None = None
+
+    @property
+    def date(self) -> datetime.datetime:
+        if self._date is None:
+            self._date = datetime.datetime.fromtimestamp(self._raw['date'])
+        return self._date
+
+    @property
+    def id(self) -> int | None:
+        """
+        id of the message (0 for messages in conversations, if the group doesn't have access to them)
+        """
+        return self._raw.get('id')
+
+    @property
+    def attachments(self) -> list[dict]:
+        """
+        raw attachments of the message
+        """
+        return self._raw.get('attachments', [])
+
+    @property
+    def reply_message(self) -> dict | None:
+        """
+        raw message, that this message replies to
+        """
+        return self._raw.get('reply_message')
+
+    @property
+    def fwd_messages(self) -> list[dict]:
+        """
+        raw forwarded messages
+        """
+        return self._raw.get('fwd_messages', [])
 
     def reply(self,
               text: str = '',
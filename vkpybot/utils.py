@@ -1,13 +1,96 @@
 import argparse
+import asyncio
+import hashlib
+import os
+import random
 
 import aiohttp
 
 
-async def get(url, params):
-    async with aiohttp.ClientSession() as session:
-        # proxy='http://proxy.server:3128'
-        async with session.get(url, params=params) as resp:
-            return await resp.json()
+async def get(url, params, session: aiohttp.ClientSession | None = None, **kwargs):
+    """
+    Makes GET-request and returns decoded JSON-response
+
+    Args:
+        url: url of the request
+        params: query params of the request
+        session: pooled client session to use, a temporary one is created if not passed
+        **kwargs: additional arguments of the request (e.g. timeout)
+
+    Raises:
+        aiohttp.ClientResponseError: if response has error status or isn't JSON
+    """
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await get(url, params, session, **kwargs)
+    # proxy='http://proxy.server:3128'
+    async with session.get(url, params=params, **kwargs) as resp:
+        resp.raise_for_status()
+        return await resp.json()
+
+
+async def post(url, data, session: aiohttp.ClientSession | None = None):
+    """
+    Makes POST-request with form-encoded body and returns decoded JSON-response
+
+    Args:
+        url: url of the request
+        data: form fields of the request
+        session: pooled client session to use, a temporary one is created if not passed
+    """
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await post(url, data, session)
+    async with session.post(url, data=data) as resp:
+        resp.raise_for_status()
+        return await resp.json()
+
+
+async def file_digest(path: str | os.PathLike) -> str:
+    """
+    Computes SHA-256 of the file content in a thread, so big files don't block the event loop
+
+    Returns:
+        hex digest of the file
+    """
+    def digest():
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as file:
+            while chunk := file.read(2 ** 16):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    return await asyncio.to_thread(digest)
+
+
+class Backoff:
+    """
+    Exponentially growing delays between retries with random jitter
+    """
+
+    def __init__(self, base: float = 0.5, factor: float = 2., cap: float = 30., jitter: bool = True):
+        """
+        Args:
+            base: delay before the first retry
+            factor: multiplier of the delay for every next retry
+            cap: maximum delay
+            jitter: whether to randomize the delay between 0 and its value (to spread retries of many clients)
+        """
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        """
+        Args:
+            attempt: number of the retry, starting from 0
+
+        Returns:
+            seconds to wait before the retry
+        """
+        delay = min(self.cap, self.base * self.factor ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
 
 
 # Source: https://stackoverflow.com/a/53284255